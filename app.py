@@ -16,12 +16,15 @@ db_initialized = init_db(app)
 
 # Only import blueprints after DB is initialized
 if db_initialized:
+    from utils import load_auth_context
+    app.before_request(load_auth_context)  # Decode the JWT once per request into flask.g
+
     from routes.auth import auth_bp
     from routes.chat import chat_bp
     from routes.assessment import assessment_bp
     from routes.feedback import feedback_bp
     from routes.user import user_bp
-    # from routes.admin import admin_bp
+    from routes.admin import admin_bp
     
     # Register Blueprints
     app.register_blueprint(auth_bp)
@@ -29,7 +32,7 @@ if db_initialized:
     app.register_blueprint(assessment_bp)
     app.register_blueprint(feedback_bp)
     app.register_blueprint(user_bp)
-    # app.register_blueprint(admin_bp)
+    app.register_blueprint(admin_bp)
     # app.register_blueprint(model_api_bp)
     
 
@@ -64,6 +67,12 @@ def debug_db():
         }
     })
 
+@app.route("/debug/cache", methods=["GET"])
+def debug_cache():
+    from utils import get_cache_stats
+    from photos import photo_cache_stats
+    return jsonify({**get_cache_stats(), "photos": photo_cache_stats()})
+
 if __name__ == "__main__":
     app.start_time = time.time()
     logging.info("Starting AIRA Therapist application")
@@ -0,0 +1,52 @@
+"""Microbenchmark: per-request chain construction vs. the shared process-wide chain.
+
+Run from the repository root:
+
+    python -m benchmarks.chain_construction [--iterations 2000]
+
+The Groq model is swapped for langchain's FakeListChatModel so the benchmark
+needs no network access or API key; only construction/lookup cost is measured.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import utils
+
+
+def measure(fn, iterations):
+    """Return (mean microseconds per call, peak KiB allocated) for fn."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / iterations * 1e6, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    utils.model = FakeListChatModel(responses=["ok"])
+    utils.get_chain()  # Warm the shared chain
+
+    before_us, before_kib = measure(utils.create_chain, args.iterations)
+    after_us, after_kib = measure(utils.get_chain, args.iterations)
+
+    print(f"{'mode':<28}{'us/request':>12}{'peak KiB':>12}")
+    print(f"{'create_chain() per request':<28}{before_us:>12.2f}{before_kib:>12.1f}")
+    print(f"{'get_chain() shared':<28}{after_us:>12.2f}{after_kib:>12.1f}")
+    if after_us > 0:
+        print(f"speedup: {before_us / after_us:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
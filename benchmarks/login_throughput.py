@@ -0,0 +1,98 @@
+"""Load test: login throughput alongside concurrent chat traffic.
+
+Start the app (e.g. ``gunicorn app:app``), register a test user, then run
+from the repository root:
+
+    python -m benchmarks.login_throughput --email a@b.c --password secret \\
+        [--base-url http://localhost:5000] [--logins 8] [--chatters 4] [--duration 30]
+
+``--logins`` threads log in back to back while ``--chatters`` threads send
+/api/chat/send messages with a token obtained up front. Compare runs with
+different PASSWORD_HASH_WORKERS / PASSWORD_HASH_QUEUE_LIMIT settings: chat
+latency should stay flat while excess logins are shed with 503s.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def post(url, payload, token=None, timeout=60):
+    """POST JSON; return (status, seconds, parsed body or None)."""
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(), headers=headers, method="POST")
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            status, body = resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        status, body = e.code, e.read()
+    elapsed = time.perf_counter() - start
+    try:
+        return status, elapsed, json.loads(body)
+    except ValueError:
+        return status, elapsed, None
+
+
+def worker(stop, results, request_fn):
+    while not stop.is_set():
+        status, elapsed, _ = request_fn()
+        results.append((status, elapsed))
+
+
+def summarize(name, results, duration):
+    ok = [elapsed for status, elapsed in results if status < 400]
+    shed = sum(1 for status, _ in results if status == 503)
+    errors = len(results) - len(ok) - shed
+    line = f"{name:<8}{len(ok) / duration:>10.1f}{shed:>8}{errors:>8}"
+    if ok:
+        ok.sort()
+        p95 = ok[min(len(ok) - 1, int(len(ok) * 0.95))]
+        line += f"{statistics.median(ok) * 1000:>10.0f}{p95 * 1000:>10.0f}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=8, help="Concurrent login threads")
+    parser.add_argument("--chatters", type=int, default=4, help="Concurrent /api/chat/send threads")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    args = parser.parse_args()
+
+    credentials = {"email": args.email, "password": args.password}
+    login_url = f"{args.base_url}/api/auth/login"
+    status, _, body = post(login_url, credentials)
+    if status != 200:
+        raise SystemExit(f"Login failed ({status}): {body}")
+    token = body["token"]
+    send_url = f"{args.base_url}/api/chat/send"
+
+    stop = threading.Event()
+    login_results, chat_results = [], []
+    threads = [threading.Thread(target=worker, args=(stop, login_results, lambda: post(login_url, credentials)))
+               for _ in range(args.logins)]
+    threads += [threading.Thread(target=worker, args=(stop, chat_results,
+                                                      lambda: post(send_url, {"message": "How can I sleep better?"}, token)))
+                for _ in range(args.chatters)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"{'traffic':<8}{'ok/s':>10}{'503s':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    summarize("login", login_results, args.duration)
+    summarize("chat", chat_results, args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Startup benchmark: wall time and `python -X importtime` breakdown of importing the app.
+
+Run from the repository root:
+
+    python -m benchmarks.startup_time [--module app] [--runs 3] [--top 15] [--json]
+
+Each run imports the module in a fresh interpreter, so caches from earlier
+runs (other than the OS page cache) do not help. The report shows the best
+wall time and the packages that cost the most to import, with each module's
+self time charged to its root package, so langchain_core, pydantic, torch
+and so on show up on their own wherever they were first imported from.
+``--json`` prints one machine-readable line to append to a history file and
+track over time.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def import_once(module: str):
+    """Import module in a fresh interpreter; return (wall seconds, {root package: summed self us})."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, env={**os.environ, "PYTHONWARNINGS": "ignore"}
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise SystemExit(f"❌ import {module} failed:\n{proc.stderr[-2000:]}")
+
+    packages = {}
+    for line in proc.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        # Self times don't overlap, so summing them per root package never double counts
+        root = name.strip().split(".")[0]
+        packages[root] = packages.get(root, 0) + int(self_us)
+    return wall, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app", help="Module to import (default: app)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="Print one JSON line instead of a table")
+    args = parser.parse_args()
+
+    runs = [import_once(args.module) for _ in range(args.runs)]
+    wall, packages = min(runs, key=lambda run: run[0])
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({
+            "module": args.module,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "wall_ms": round(wall * 1000, 1),
+            "import_ms": round(sum(packages.values()) / 1000, 1),
+            "top": {name: round(us / 1000, 1) for name, us in top},
+        }))
+        return
+
+    print(f"import {args.module}: best wall {wall * 1000:.0f} ms over {args.runs} runs, "
+          f"{sum(packages.values()) / 1000:.0f} ms in imports")
+    print(f"{'package':<32}{'self ms':>14}")
+    for name, us in top:
+        print(f"{name:<32}{us / 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """Thread-safe LRU cache with a TTL and caps on entry count and approximate bytes.
+
+    Every operation is O(1) amortized: entries live in an OrderedDict in
+    recency order, and a second one keeps keys in insertion order for the
+    TTL. The TTL runs from the last put, not the last get, so a hit moves an
+    entry in recency order only. An expired entry is dropped when it is
+    looked up, and inserts first drop expired entries from the head of the
+    insertion order (wherever they sit in recency order), then evict from the
+    least recently used end until both caps hold.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = None, ttl: float = None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 0)
+        self.entries = OrderedDict()  # key -> (stored_at, size, value), least recently used first
+        self.stored = OrderedDict()  # key -> stored_at, oldest put first (only kept with a ttl)
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def is_expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def drop(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.stored.pop(key, None)
+        self.bytes -= size
+
+    def get(self, key, default=None):
+        """Return the cached value (marking it recently used), or default if missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if self.is_expired(entry[0], time.time()):
+                self.drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def peek(self, key, default=None):
+        """Return a live cached value without touching recency or counters."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or self.is_expired(entry[0], time.time()):
+                return default
+            return entry[2]
+
+    def put(self, key, value, size: int = None):
+        """Insert or refresh a value (restarting its TTL) and evict down to the caps."""
+        size = self.sizeof(value) if size is None else size
+        with self.lock:
+            if key in self.entries:
+                self.drop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return False  # Larger than the whole budget; never cacheable
+            now = time.time()
+            self.entries[key] = (now, size, value)
+            if self.ttl is not None:
+                self.stored[key] = now
+            self.bytes += size
+            self.evict(now)
+            return True
+
+    def evict(self, now: float):
+        while self.stored:
+            oldest_key, stored_at = next(iter(self.stored.items()))
+            if not self.is_expired(stored_at, now):
+                break
+            self.drop(oldest_key)
+            self.expirations += 1
+        while self.entries and (len(self.entries) > self.max_entries or
+                                (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            self.drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Remove a key and return its value."""
+        with self.lock:
+            if key not in self.entries:
+                return default
+            value = self.entries[key][2]
+            self.drop(key)
+            return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.stored.clear()
+            self.bytes = 0
+
+    def __contains__(self, key):
+        return self.peek(key) is not None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self) -> dict:
+        """Return size, budget and hit/miss/eviction counters."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,107 @@
+"""Compact, memory-mapped docstore for the therapist-reply vector store.
+
+Documents are stored in FAISS index order as two files next to index.faiss:
+
+    docstore.bin          UTF-8 JSON records ({"id", "page_content", "metadata"}) back to back
+    docstore.offsets.npy  uint64 offset table with ntotal + 1 entries
+
+Both are memory-mapped read-only, so gunicorn workers share the same pages and
+startup does no unpickling.
+"""
+import json
+import mmap
+import os
+import shutil
+from collections.abc import Mapping
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.base import Docstore
+
+BLOB_FILE = "docstore.bin"
+OFFSETS_FILE = "docstore.offsets.npy"
+
+def has_compact_docstore(path: str) -> bool:
+    """Return True if path contains a compact docstore."""
+    return os.path.exists(os.path.join(path, BLOB_FILE)) and os.path.exists(os.path.join(path, OFFSETS_FILE))
+
+def encode_document(doc_id, doc: Document) -> bytes:
+    """Serialize one document as a UTF-8 JSON record."""
+    return json.dumps(
+        {"id": str(doc_id), "page_content": doc.page_content, "metadata": doc.metadata},
+        ensure_ascii=False
+    ).encode("utf-8")
+
+def write_compact_docstore(path: str, records):
+    """Write (doc_id, Document) pairs, in index order, as a blob plus offset table."""
+    offsets = [0]
+    with open(os.path.join(path, BLOB_FILE), "wb") as blob:
+        for doc_id, doc in records:
+            data = encode_document(doc_id, doc)
+            blob.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(os.path.join(path, OFFSETS_FILE), np.asarray(offsets, dtype="uint64"))
+    return len(offsets) - 1
+
+def append_compact_docstore(source: str, target: str, records):
+    """Copy the docstore in source to target and append (doc_id, Document) pairs to the copy."""
+    offsets = [int(offset) for offset in np.load(os.path.join(source, OFFSETS_FILE))]
+    with open(os.path.join(source, BLOB_FILE), "rb") as src, open(os.path.join(target, BLOB_FILE), "wb") as blob:
+        shutil.copyfileobj(src, blob)
+        for doc_id, doc in records:
+            data = encode_document(doc_id, doc)
+            blob.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(os.path.join(target, OFFSETS_FILE), np.asarray(offsets, dtype="uint64"))
+    return len(offsets) - 1
+
+class MmapDocstore(Docstore):
+    """Read-only docstore keyed by FAISS row position, backed by mmapped files."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(path, BLOB_FILE), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # mmap of an empty file is an error; an empty store just has no records
+            self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def record(self, position: int) -> dict:
+        """Decode the raw record stored at a row position."""
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return json.loads(self.blob[start:end].decode("utf-8"))
+
+    def search(self, search: int):
+        try:
+            position = int(search)
+        except (TypeError, ValueError):
+            return f"ID {search} not found."
+        if not 0 <= position < len(self):
+            return f"ID {search} not found."
+        record = self.record(position)
+        return Document(page_content=record["page_content"], metadata=record.get("metadata") or {})
+
+    def records(self):
+        """Yield (doc_id, Document) pairs in index order."""
+        for position in range(len(self)):
+            record = self.record(position)
+            yield record["id"], Document(page_content=record["page_content"], metadata=record.get("metadata") or {})
+
+class PositionalIds(Mapping):
+    """index_to_docstore_id stand-in mapping row i to itself, without building a dict."""
+
+    def __init__(self, ntotal: int):
+        self.ntotal = ntotal
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.ntotal:
+            raise KeyError(i)
+        return i
+
+    def __iter__(self):
+        return iter(range(self.ntotal))
+
+    def __len__(self):
+        return self.ntotal
@@ -8,3 +8,45 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 PORT = int(os.getenv("PORT", 5000))
 print(f"🔍 Loaded MONGO_URI: {MONGO_URI}")
+CHAT_PIPELINE_MODE = os.getenv("CHAT_PIPELINE_MODE", "chain")  # "chain" or "concurrent"
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", 8))
+SUMMARY_MAX_WORKERS = int(os.getenv("SUMMARY_MAX_WORKERS", 1))  # Background summary calls, separate from the request path
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 2048))  # 0 disables the cache
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 5))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 32))  # 1 disables micro-batching
+FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR", "faiss_therapist_replies")
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")  # flat, ivf_flat, hnsw or ivf_pq
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", 8))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", 64))
+FAISS_LOAD_MODE = os.getenv("FAISS_LOAD_MODE", "pickle")  # "pickle" or "mmap" (compact docstore)
+FAISS_RELOAD_INTERVAL = int(os.getenv("FAISS_RELOAD_INTERVAL", 30))  # Seconds between snapshot checks, 0 disables
+FAISS_SNAPSHOTS_KEEP = int(os.getenv("FAISS_SNAPSHOTS_KEEP", 3))
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", 1000))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+SESSION_CACHE_TTL = int(os.getenv("SESSION_CACHE_TTL", 300))  # Seconds since the session was last loaded or written
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", 10))  # User/AI message pairs replayed into the prompt
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 2000))  # Including the running summary
+HISTORY_SUMMARY_BATCH = int(os.getenv("HISTORY_SUMMARY_BATCH", 4))  # Messages folded into the summary per update
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", 200))
+DB_ENSURE_INDEXES = os.getenv("DB_ENSURE_INDEXES", "true").lower() == "true"
+DB_QUERY_PLAN_REPORT = os.getenv("DB_QUERY_PLAN_REPORT", "false").lower() == "true"  # explain() hot queries at boot
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "false").lower() == "true"
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 100))
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", 0.5))  # Seconds between flushes
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", 10000))  # Beyond this, turns are written synchronously
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", 5))  # Failed attempts before a batch is dead-lettered
+WRITE_BEHIND_DEAD_LETTER_PATH = os.getenv("WRITE_BEHIND_DEAD_LETTER_PATH", "chat_dead_letter.jsonl")
+ASSESSMENT_STORE = os.getenv("ASSESSMENT_STORE", "memory")  # "memory" (single process) or "mongo" (shared)
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")  # Required in the X-Admin-Key header for /api/admin; unset disables it
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))  # Verified JWTs kept per process, 0 disables
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", 300))  # Seconds; entries also never outlive the token's exp
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")  # werkzeug method string; changing it rehashes on login
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))  # Processes per app worker
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 16))  # Queued + running hashes before 503
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))  # Seconds a request waits for its hash
+PHOTO_CACHE_MAX_AGE = int(os.getenv("PHOTO_CACHE_MAX_AGE", 365 * 24 * 3600))  # Seconds; photo file ids are immutable
+PHOTO_MEMORY_CACHE_BYTES = int(os.getenv("PHOTO_MEMORY_CACHE_BYTES", 32 * 1024 * 1024))  # Per process, 0 disables
+PHOTO_MEMORY_CACHE_ITEM_BYTES = int(os.getenv("PHOTO_MEMORY_CACHE_ITEM_BYTES", 512 * 1024))  # Larger files are streamed
+NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR", "nltk_data")  # Vendored with `python -m nltk_resources`
+NLTK_AUTO_DOWNLOAD = os.getenv("NLTK_AUTO_DOWNLOAD", "false").lower() == "true"  # Fetch missing data on first use
@@ -0,0 +1,93 @@
+import datetime
+from database import models
+
+def results_collection():
+    return models.mongo.db["assessment_results"]
+
+def rollups_collection():
+    return models.mongo.db["assessment_rollups"]
+
+def rollup_update(result: dict) -> dict:
+    """Update folding one result into its (user_id, category, day) rollup."""
+    return {
+        "$inc": {"count": 1, "score_sum": result["mental_score"]},
+        "$min": {"score_min": result["mental_score"]},
+        "$max": {"score_max": result["mental_score"]},
+        "$set": {"last_score": result["mental_score"], "last_level": result["level"], "updated_at": result["timestamp"]},
+    }
+
+def record_result(result: dict):
+    """Store a completed assessment and fold it into the per-day rollup.
+
+    result holds user_id, category, mental_score, level and timestamp (datetime).
+    """
+    results_collection().insert_one(dict(result))
+    day = result["timestamp"].strftime("%Y-%m-%d")
+    rollups_collection().update_one(
+        {"user_id": result["user_id"], "category": result["category"], "day": day},
+        rollup_update(result),
+        upsert=True
+    )
+
+def get_trends(user_id: str, category: str = None, days: int = None) -> dict:
+    """Return per-category daily score points for a user, read from rollups only.
+
+    Cost is O(categories x days), independent of how many raw results exist.
+    """
+    query = {"user_id": user_id}
+    if category:
+        query["category"] = category
+    if days:
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+        query["day"] = {"$gte": since.strftime("%Y-%m-%d")}
+
+    trends = {}
+    rollups = rollups_collection().find(query, {"_id": 0, "user_id": 0}).sort([("category", 1), ("day", 1)])
+    for rollup in rollups:
+        trend = trends.setdefault(rollup["category"], {"points": [], "assessments": 0})
+        trend["points"].append({
+            "day": rollup["day"],
+            "count": rollup["count"],
+            "average_score": round(rollup["score_sum"] / rollup["count"], 2),
+            "min_score": rollup["score_min"],
+            "max_score": rollup["score_max"],
+            "last_score": rollup["last_score"],
+            "last_level": rollup["last_level"],
+        })
+        trend["assessments"] += rollup["count"]
+
+    for trend in trends.values():
+        points = trend["points"]
+        trend["latest_score"] = points[-1]["last_score"]
+        trend["latest_level"] = points[-1]["last_level"]
+        trend["change"] = round(points[-1]["average_score"] - points[0]["average_score"], 2)
+    return trends
+
+def rebuild_rollups(db, batch_size: int = None) -> int:
+    """Recompute every rollup from assessment_results with one aggregation pipeline ($merge)."""
+    db["assessment_results"].aggregate([
+        {"$sort": {"timestamp": 1}},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "category": "$category",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+            },
+            "count": {"$sum": 1},
+            "score_sum": {"$sum": "$mental_score"},
+            "score_min": {"$min": "$mental_score"},
+            "score_max": {"$max": "$mental_score"},
+            "last_score": {"$last": "$mental_score"},
+            "last_level": {"$last": "$level"},
+            "updated_at": {"$last": "$timestamp"},
+        }},
+        {"$replaceWith": {"$mergeObjects": ["$_id", "$$ROOT"]}},
+        {"$unset": "_id"},
+        {"$merge": {
+            "into": "assessment_rollups",
+            "on": ["user_id", "category", "day"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ])
+    return db["assessment_rollups"].count_documents({})
@@ -0,0 +1,162 @@
+import datetime
+import threading
+from collections import OrderedDict
+from pymongo import ReturnDocument
+from config import ASSESSMENT_STORE
+from database import models
+
+class MemoryAssessmentStore:
+    """Per-process assessment state with O(1) amortized expiry.
+
+    Entries are kept in last-write order, so expired ones are always at the
+    front and are dropped without scanning the rest. Only suitable for a
+    single worker process.
+    """
+
+    def __init__(self, expiry_minutes: int):
+        self.expiry = datetime.timedelta(minutes=expiry_minutes)
+        self.sessions = OrderedDict()  # {user_id: {"category", "question_ids", "answers", "timestamp"}}
+        self.lock = threading.Lock()
+
+    def expire(self, now):
+        while self.sessions:
+            user_id, state = next(iter(self.sessions.items()))
+            if now - state["timestamp"] <= self.expiry:
+                break
+            del self.sessions[user_id]
+
+    def touch(self, user_id, state):
+        state["timestamp"] = datetime.datetime.utcnow()
+        self.sessions[user_id] = state
+        self.sessions.move_to_end(user_id)
+
+    def start(self, user_id):
+        with self.lock:
+            self.expire(datetime.datetime.utcnow())
+            self.touch(user_id, {"category": None, "question_ids": [], "answers": []})
+
+    def get(self, user_id):
+        """Return a copy of the user's live state, or None."""
+        with self.lock:
+            self.expire(datetime.datetime.utcnow())
+            state = self.sessions.get(user_id)
+            if state is None:
+                return None
+            return {**state, "question_ids": list(state["question_ids"]), "answers": list(state["answers"])}
+
+    def set_category(self, user_id, category, first_question_id):
+        with self.lock:
+            if user_id not in self.sessions:
+                return False
+            self.touch(user_id, {"category": category, "question_ids": [first_question_id], "answers": []})
+            return True
+
+    def record_answer(self, user_id, question_id, answer, next_question_id=None):
+        """Record the answer to question_id if it is the pending question (and push the next question id).
+
+        Returns the new state, or None if the session is gone or question_id
+        was already answered (a replayed or concurrent submission).
+        """
+        with self.lock:
+            state = self.sessions.get(user_id)
+            if (state is None or not state["question_ids"] or state["question_ids"][-1] != question_id
+                    or len(state["answers"]) != len(state["question_ids"]) - 1):
+                return None
+            state["answers"].append(answer)
+            if next_question_id is not None:
+                state["question_ids"].append(next_question_id)
+            self.touch(user_id, state)
+            return {**state, "question_ids": list(state["question_ids"]), "answers": list(state["answers"])}
+
+    def delete(self, user_id):
+        with self.lock:
+            self.sessions.pop(user_id, None)
+
+class MongoAssessmentStore:
+    """Assessment state shared by all workers, in a collection with a TTL index on expires_at.
+
+    Each answer is a single conditional find-and-modify, so concurrent or
+    replayed submissions cannot record two answers for one question.
+    """
+
+    def __init__(self, expiry_minutes: int):
+        self.expiry = datetime.timedelta(minutes=expiry_minutes)
+
+    @property
+    def collection(self):
+        return models.mongo.db["assessment_sessions"]
+
+    def expires_at(self):
+        return datetime.datetime.utcnow() + self.expiry
+
+    def live(self, user_id):
+        """Filter for an unexpired session (the TTL monitor only runs once a minute)."""
+        return {"_id": user_id, "expires_at": {"$gt": datetime.datetime.utcnow()}}
+
+    @staticmethod
+    def to_state(doc):
+        if doc is None:
+            return None
+        return {
+            "category": doc.get("category"),
+            "question_ids": doc.get("question_ids", []),
+            "answers": doc.get("answers", []),
+            "timestamp": doc["expires_at"],
+        }
+
+    def start(self, user_id):
+        self.collection.replace_one(
+            {"_id": user_id},
+            {"category": None, "question_ids": [], "answers": [], "expires_at": self.expires_at()},
+            upsert=True
+        )
+
+    def get(self, user_id):
+        return self.to_state(self.collection.find_one(self.live(user_id)))
+
+    def set_category(self, user_id, category, first_question_id):
+        result = self.collection.update_one(
+            self.live(user_id),
+            {"$set": {"category": category, "question_ids": [first_question_id], "answers": [],
+                      "expires_at": self.expires_at()}}
+        )
+        return result.matched_count == 1
+
+    def record_answer(self, user_id, question_id, answer, next_question_id=None):
+        """Record the answer to question_id if it is the pending question (and push the next question id).
+
+        Returns the new state, or None if the session is gone or question_id
+        was already answered (a replayed or concurrent submission).
+        """
+        update = {"$push": {"answers": answer}, "$set": {"expires_at": self.expires_at()}}
+        if next_question_id is not None:
+            update["$push"]["question_ids"] = next_question_id
+        doc = self.collection.find_one_and_update(
+            {**self.live(user_id),
+             "$expr": {"$and": [
+                 {"$eq": [{"$arrayElemAt": ["$question_ids", -1]}, question_id]},
+                 {"$eq": [{"$size": "$answers"}, {"$subtract": [{"$size": "$question_ids"}, 1]}]},
+             ]}},
+            update,
+            return_document=ReturnDocument.AFTER
+        )
+        return self.to_state(doc)
+
+    def delete(self, user_id):
+        self.collection.delete_one({"_id": user_id})
+
+ASSESSMENT_STORES = {
+    "memory": MemoryAssessmentStore,
+    "mongo": MongoAssessmentStore,
+}
+
+store = None
+
+def get_assessment_store(expiry_minutes: int):
+    """Return the configured assessment-state backend (ASSESSMENT_STORE)."""
+    global store
+    if store is None:
+        if ASSESSMENT_STORE not in ASSESSMENT_STORES:
+            raise ValueError(f"Unknown ASSESSMENT_STORE '{ASSESSMENT_STORE}'. Choose from: {', '.join(ASSESSMENT_STORES)}")
+        store = ASSESSMENT_STORES[ASSESSMENT_STORE](expiry_minutes)
+    return store
@@ -0,0 +1,120 @@
+"""Incrementally maintained feedback rollups.
+
+Every like/dislike and daily rating also updates small counter documents in
+``feedback_rollups``, so analytics read O(days) documents, not raw feedback:
+
+    {"scope": "day",        "day": "YYYY-MM-DD"}                      all users
+    {"scope": "cohort_day", "day": "YYYY-MM-DD", "cohort": "YYYY-MM"}  users grouped by signup month
+    {"scope": "response",   "response_id": ...}                       one AI response
+
+each with likes, dislikes, rating_sum and rating_count counters. A rating
+that flips like <-> dislike moves its count from the old bucket to the new.
+"""
+import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from database import models
+
+COUNTERS = {"like": "likes", "dislike": "dislikes"}
+
+def rollups_collection():
+    return models.mongo.db["feedback_rollups"]
+
+def cohort_for(user_id: str) -> str:
+    """Signup-month cohort, taken from the user's ObjectId creation time."""
+    try:
+        return ObjectId(user_id).generation_time.strftime("%Y-%m")
+    except (InvalidId, TypeError):
+        return "unknown"
+
+def day_of(timestamp: datetime.datetime) -> str:
+    return timestamp.strftime("%Y-%m-%d")
+
+def counter_ops(user_id: str, day: str, inc: dict, response_id: str = None) -> list:
+    """UpdateOnes applying inc to the day, cohort-day and (optionally) response rollups."""
+    keys = [
+        {"scope": "day", "day": day},
+        {"scope": "cohort_day", "day": day, "cohort": cohort_for(user_id)},
+    ]
+    if response_id is not None:
+        keys.append({"scope": "response", "response_id": response_id})
+    return [UpdateOne(key, {"$inc": inc}, upsert=True) for key in keys]
+
+def response_feedback_ops(user_id: str, previous: dict, feedback: dict) -> list:
+    """Rollup updates for a like/dislike, undoing the rating it replaces (if any)."""
+    if previous and previous.get("feedback_type") == feedback["feedback_type"]:
+        return []  # Only the comment/timestamp changed
+    operations = counter_ops(user_id, day_of(feedback["timestamp"]), {COUNTERS[feedback["feedback_type"]]: 1},
+                             feedback["response_id"])
+    if previous and previous.get("feedback_type") in COUNTERS:
+        operations += counter_ops(user_id, day_of(previous["timestamp"]), {COUNTERS[previous["feedback_type"]]: -1},
+                                  feedback["response_id"])
+    return operations
+
+def daily_rating_ops(user_id: str, rating, timestamp: datetime.datetime) -> list:
+    """Rollup updates for one end-of-day rating."""
+    return counter_ops(user_id, day_of(timestamp), {"rating_sum": rating, "rating_count": 1})
+
+def apply(operations: list):
+    if operations:
+        rollups_collection().bulk_write(operations, ordered=False)
+
+def summarize(doc: dict) -> dict:
+    """Add derived like_ratio and average_rating to a rollup document."""
+    likes, dislikes = doc.get("likes", 0), doc.get("dislikes", 0)
+    rating_count = doc.get("rating_count", 0)
+    return {
+        **{key: value for key, value in doc.items() if key not in ("_id", "scope")},
+        "likes": likes,
+        "dislikes": dislikes,
+        "like_ratio": round(likes / (likes + dislikes), 4) if likes + dislikes else None,
+        "average_rating": round(doc.get("rating_sum", 0) / rating_count, 2) if rating_count else None,
+    }
+
+def since_day(days: int) -> str:
+    return day_of(datetime.datetime.utcnow() - datetime.timedelta(days=days))
+
+def daily_stats(days: int = 30) -> list:
+    """Per-day like/dislike ratio and average daily rating across all users."""
+    docs = rollups_collection().find({"scope": "day", "day": {"$gte": since_day(days)}}).sort("day", 1)
+    return [summarize(doc) for doc in docs]
+
+def cohort_stats(days: int = 30, cohort: str = None) -> list:
+    """Per-day stats for each signup-month cohort."""
+    query = {"scope": "cohort_day", "day": {"$gte": since_day(days)}}
+    if cohort:
+        query["cohort"] = cohort
+    docs = rollups_collection().find(query).sort([("cohort", 1), ("day", 1)])
+    return [summarize(doc) for doc in docs]
+
+def response_stats(response_ids: list = None, limit: int = 50, sort: str = "dislikes") -> list:
+    """Stats for the given responses, or the `limit` responses with the most `sort` ratings."""
+    query = {"scope": "response"}
+    if response_ids:
+        query["response_id"] = {"$in": response_ids}
+        docs = rollups_collection().find(query)
+    else:
+        docs = rollups_collection().find(query).sort(sort, -1).limit(limit)
+    return [summarize(doc) for doc in docs]
+
+def rebuild_rollups(db, batch_size: int = 1000) -> int:
+    """Recompute all feedback rollups from raw feedback (one-off backfill)."""
+    db["feedback_rollups"].delete_many({})
+    operations = []
+
+    def flush(force=False):
+        if operations and (force or len(operations) >= batch_size):
+            db["feedback_rollups"].bulk_write(operations, ordered=False)
+            operations.clear()
+
+    for doc in db["feedback_responses"].find({}, {"user_id": 1, "feedbacks": 1}):
+        for feedback in doc.get("feedbacks", []):
+            if feedback.get("feedback_type") in COUNTERS and feedback.get("timestamp"):
+                operations.extend(response_feedback_ops(doc["user_id"], None, feedback))
+                flush()
+    for doc in db["daily_feedback"].find({}, {"user_id": 1, "rating": 1, "timestamp": 1}):
+        operations.extend(daily_rating_ops(doc["user_id"], doc["rating"], doc["timestamp"]))
+        flush()
+    flush(force=True)
+    return db["feedback_rollups"].count_documents({})
@@ -0,0 +1,71 @@
+"""One-shot data migrations.
+
+Usage (from the repository root):
+
+    python -m database.migrations chat_messages [--batch-size 500]
+    python -m database.migrations assessment_rollups
+    python -m database.migrations feedback_rollups
+    python -m database.migrations photo_gc
+"""
+import argparse
+from pymongo import UpdateOne
+from database.models import split_message
+from database.assessment_results import rebuild_rollups as rebuild_assessment_rollups
+from database.feedback_rollups import rebuild_rollups as rebuild_feedback_rollups
+from photos import collect_orphans
+
+def migrate_chat_messages(db, batch_size: int = 500) -> int:
+    """Move embedded chat_history.messages arrays into per-message chat_messages documents.
+
+    Idempotent: messages are upserted on (session_id, seq), and a session's
+    array is only removed after all of its messages are written. Safe to run
+    while the app is serving: the app numbers new turns of an unmigrated
+    session after its embedded messages, so they never collide with the
+    seqs written here, and message_count only ever moves forward.
+    """
+    sessions = db["chat_history"].find({"messages.0": {"$exists": True}}, {"session_id": 1, "messages": 1})
+    migrated = 0
+    for session in sessions:
+        session_id = session["session_id"]
+        messages = session["messages"]
+        for start in range(0, len(messages), batch_size):
+            db["chat_messages"].bulk_write([
+                UpdateOne(
+                    {"session_id": session_id, "seq": seq},
+                    {"$setOnInsert": {"session_id": session_id, "seq": seq, **split_message(msg)}},
+                    upsert=True
+                )
+                for seq, msg in enumerate(messages[start:start + batch_size], start=start)
+            ], ordered=False)
+        db["chat_history"].update_one(
+            {"_id": session["_id"]},
+            {"$max": {"message_count": len(messages)}, "$unset": {"messages": ""}}
+        )
+        migrated += 1
+        print(f"✅ Migrated {len(messages)} messages for session {session_id}")
+    return migrated
+
+MIGRATIONS = {
+    "chat_messages": migrate_chat_messages,
+    "assessment_rollups": rebuild_assessment_rollups,
+    "feedback_rollups": rebuild_feedback_rollups,
+    "photo_gc": collect_orphans,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    from flask import Flask
+    from database.models import init_db, get_database
+    app = Flask(__name__)
+    if not init_db(app):
+        raise SystemExit("❌ Database initialization failed")
+
+    count = MIGRATIONS[args.migration](get_database(), batch_size=args.batch_size)
+    print(f"✅ {args.migration}: {count} documents")
+
+if __name__ == "__main__":
+    main()
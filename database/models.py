@@ -1,5 +1,7 @@
 from flask_pymongo import PyMongo
-from config import MONGO_URI
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+from config import MONGO_URI, DB_ENSURE_INDEXES, DB_QUERY_PLAN_REPORT
 from flask import Flask
 
 mongo = PyMongo()
@@ -7,9 +9,108 @@ mongo = PyMongo()
 # Global collections
 users_collection = None
 chat_history_collection = None
+chat_messages_collection = None
 feedback_collection = None
 question_collection = None
 
+# Indexes behind the hot queries: {collection: [(keys, options), ...]}
+INDEX_SPECS = {
+    "users": [
+        ([("email", ASCENDING)], {"unique": True}),
+    ],
+    "chat_history": [
+        ([("session_id", ASCENDING)], {"unique": True}),
+        ([("user_id", ASCENDING)], {}),
+    ],
+    "chat_messages": [
+        ([("session_id", ASCENDING), ("seq", ASCENDING)], {"unique": True}),
+        ([("response_id", ASCENDING)], {"sparse": True}),
+    ],
+    "feedback_responses": [
+        ([("user_id", ASCENDING), ("session_id", ASCENDING)], {"unique": True}),  # The feedback upsert key
+        ([("user_id", ASCENDING), ("session_id", ASCENDING), ("feedbacks.response_id", ASCENDING)], {}),
+    ],
+    "questions": [
+        ([("category", ASCENDING)], {}),
+    ],
+    "feedback_rollups": [
+        ([("scope", ASCENDING), ("day", ASCENDING), ("cohort", ASCENDING), ("response_id", ASCENDING)], {"unique": True}),
+        ([("scope", ASCENDING), ("likes", ASCENDING)], {}),
+        ([("scope", ASCENDING), ("dislikes", ASCENDING)], {}),
+    ],
+    "assessment_results": [
+        ([("user_id", ASCENDING), ("category", ASCENDING), ("timestamp", ASCENDING)], {}),
+    ],
+    "assessment_rollups": [
+        ([("user_id", ASCENDING), ("category", ASCENDING), ("day", ASCENDING)], {"unique": True}),
+    ],
+    "fs.files": [
+        ([("parent_id", ASCENDING), ("rendition", ASCENDING)], {"sparse": True}),
+        ([("source_sha256", ASCENDING), ("rendition", ASCENDING)], {"sparse": True}),
+    ],
+    "assessment_sessions": [
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),  # TTL: Mongo deletes expired sessions
+    ],
+}
+
+# Representative filters for the hot queries, checked with explain() at boot
+HOT_QUERIES = [
+    ("users", {"email": "probe@example.com"}),
+    ("chat_history", {"session_id": "probe"}),
+    ("chat_history", {"user_id": "probe"}),
+    ("chat_messages", {"session_id": "probe", "seq": {"$gte": 0}}),
+    ("chat_messages", {"response_id": {"$in": ["probe"]}}),
+    ("feedback_responses", {"user_id": "probe", "session_id": "probe", "feedbacks.response_id": "probe"}),
+    ("questions", {"category": "probe"}),
+]
+
+def ensure_indexes(db) -> bool:
+    """Create every index in INDEX_SPECS; safe to call on every boot (create_index is idempotent)."""
+    ok = True
+    for collection, specs in INDEX_SPECS.items():
+        for keys, options in specs:
+            try:
+                name = db[collection].create_index(keys, **options)
+                print(f"✅ Index ready: {collection}.{name}")
+            except OperationFailure as e:
+                # e.g. existing duplicates block a unique index; keep serving and report it
+                ok = False
+                print(f"❌ Could not create index on {collection} {keys}: {e}")
+    return ok
+
+def plan_stages(plan: dict):
+    """Yield every stage name in an explain() plan tree."""
+    yield plan.get("stage")
+    for child in plan.get("inputStages", []) + [plan[key] for key in ("inputStage", "queryPlan") if key in plan]:
+        yield from plan_stages(child)
+
+def report_query_plans(db) -> list:
+    """Run explain() on HOT_QUERIES and return (collection, filter) pairs that fall back to COLLSCAN."""
+    scans = []
+    for collection, query in HOT_QUERIES:
+        try:
+            plan = db[collection].find(query).explain()["queryPlanner"]["winningPlan"]
+        except Exception as e:
+            print(f"⚠️ explain() failed for {collection} {query}: {e}")
+            continue
+        if "COLLSCAN" in set(plan_stages(plan)):
+            scans.append((collection, query))
+            print(f"❌ COLLSCAN: {collection}.find({query})")
+        else:
+            print(f"✅ Indexed: {collection}.find({query})")
+    return scans
+
+def split_message(msg: dict) -> dict:
+    """Flatten a legacy embedded message (AI turns nest the message dict inside "message")."""
+    message = msg.get("message")
+    fields = {"role": msg.get("role"), "message": message, "created_at": msg.get("created_at")}
+    if isinstance(message, dict):
+        fields.update(message=message.get("message"), response_id=message.get("response_id"),
+                      created_at=message.get("created_at"))
+    elif msg.get("response_id"):
+        fields["response_id"] = msg["response_id"]
+    return fields
+
 def init_db(app: Flask):  # Explicit type hinting
     """Initialize the database connection"""
     app.config["MONGO_URI"] = MONGO_URI
@@ -28,7 +129,7 @@ def get_database():
 
 def initialize_collections():
     """Ensure database is initialized after setting collections"""
-    global users_collection, chat_history_collection, feedback_collection, question_collection
+    global users_collection, chat_history_collection, chat_messages_collection, feedback_collection, question_collection
 
     try:
         db = mongo.db  # Direct access to avoid potential recursive call
@@ -41,9 +142,15 @@ def initialize_collections():
 
         users_collection = db["users"]
         chat_history_collection = db["chat_history"]
+        chat_messages_collection = db["chat_messages"]  # One document per message, ordered by seq
         feedback_collection = db["feedback"]
         question_collection = db["questions"]
 
+        if DB_ENSURE_INDEXES:
+            ensure_indexes(db)
+        if DB_QUERY_PLAN_REPORT:
+            report_query_plans(db)
+
         # 🔍 Debugging print statements
         print(f"✅ Collections initialized successfully!")
         print(f"🔍 question_collection: {question_collection}")  # Debugging print
@@ -57,4 +164,12 @@ def initialize_collections():
 
     except Exception as e:
         print(f"❌ Database initialization failed: {e}")
-        return False
\ No newline at end of file
+        return False
+if __name__ == "__main__":
+    # python -m database.models: provision indexes and print the query-plan report
+    app = Flask(__name__)
+    if init_db(app):
+        ensure_indexes(mongo.db)
+        scans = report_query_plans(mongo.db)
+        raise SystemExit(1 if scans else 0)
+    raise SystemExit("❌ Database initialization failed")
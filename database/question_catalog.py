@@ -0,0 +1,71 @@
+import threading
+from types import MappingProxyType
+from database import models
+
+class QuestionCatalog:
+    """Immutable, per-category view of the assessment question bank.
+
+    Questions keep the order the collection returns them in, so "next
+    question" matches the find_one order the routes used before. Scores are
+    precomputed per question id, so scoring is a table lookup.
+    """
+
+    def __init__(self, questions):
+        by_category = {}
+        for question in questions:
+            frozen = {key: tuple(value) if isinstance(value, list) else value for key, value in question.items()}
+            by_category.setdefault(question["category"], []).append(MappingProxyType(frozen))
+        self.by_category = MappingProxyType({category: tuple(items) for category, items in by_category.items()})
+        self.by_id = MappingProxyType({q["_id"]: q for items in self.by_category.values() for q in items})
+        self.scores = MappingProxyType({qid: tuple(q.get("scores", ())) for qid, q in self.by_id.items()})
+        self.categories = tuple(sorted(self.by_category))  # Same order as distinct("category")
+        self.lookup = MappingProxyType({category.lower(): category for category in self.categories})
+
+    def resolve_category(self, name: str):
+        """Return the canonical category for a case-insensitive name, or None."""
+        return self.lookup.get(name.lower())
+
+    def first_question(self, category: str):
+        questions = self.by_category.get(category, ())
+        return questions[0] if questions else None
+
+    def next_question(self, category: str, asked_ids):
+        """Return the first question in the category that has not been asked, or None."""
+        asked = set(asked_ids)
+        return next((q for q in self.by_category.get(category, ()) if q["_id"] not in asked), None)
+
+    def get(self, question_id):
+        return self.by_id.get(question_id)
+
+    def __len__(self):
+        return len(self.by_id)
+
+catalog = None
+catalog_lock = threading.Lock()
+
+def load_question_catalog() -> QuestionCatalog:
+    """Read the whole question bank from MongoDB into a new catalog."""
+    if models.question_collection is None:
+        raise RuntimeError("question_collection is not initialized.")
+    return QuestionCatalog(models.question_collection.find())
+
+def get_question_catalog() -> QuestionCatalog:
+    """Lazy load the question catalog once per process."""
+    global catalog
+    if catalog is None:
+        with catalog_lock:
+            if catalog is None:
+                catalog = load_question_catalog()
+                print(f"✅ Question catalog loaded: {len(catalog)} questions in {len(catalog.categories)} categories")
+    return catalog
+
+def reload_question_catalog() -> QuestionCatalog:
+    """Rebuild the catalog after the question bank changes; readers switch atomically.
+
+    Called by POST /api/admin/questions/reload, in the worker serving the call.
+    """
+    global catalog
+    new_catalog = load_question_catalog()
+    with catalog_lock:
+        catalog = new_catalog
+    return catalog
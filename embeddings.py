@@ -0,0 +1,160 @@
+import threading
+import logging
+import queue
+import time
+from concurrent.futures import Future
+from collections import OrderedDict
+from typing import List
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache keys (MiniLM is uncased, so case and spacing don't change the vector)."""
+    return " ".join(text.lower().split())
+
+class CachedEmbeddings(Embeddings):
+    """Thread-safe LRU cache in front of another Embeddings implementation.
+
+    Only ``embed_query`` is cached; ``embed_documents`` goes straight to the
+    wrapped model. Keys are normalized input texts; when the cache holds
+    ``maxsize`` entries the least recently used one is evicted.
+    """
+
+    def __init__(self, embeddings: Embeddings, maxsize: int = 2048):
+        self.embeddings = embeddings
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key: str):
+        """Return the cached vector for key (marking it recently used), or None."""
+        with self.lock:
+            vector = self.cache.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return list(vector)
+
+    def store(self, key: str, vector: List[float]):
+        """Insert a vector, evicting least recently used entries beyond maxsize."""
+        with self.lock:
+            self.cache[key] = tuple(vector)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_text(text)
+        vector = self.lookup(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(key)
+            self.store(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Bulk ingestion texts are rarely repeated; caching them would only evict hot queries
+        return self.embeddings.embed_documents(texts)
+
+    def clear(self):
+        """Drop all cached vectors and reset counters."""
+        with self.lock:
+            self.cache.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Return cache size, hit/miss/eviction counters and hit rate."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.cache),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+class MicroBatchingEmbeddings(Embeddings):
+    """Coalesce concurrent embed_query calls into batched embed_documents calls.
+
+    Callers enqueue their text and block on a Future; a single worker thread
+    waits up to ``max_wait_ms`` after the first queued request (or until
+    ``max_batch_size`` requests are queued), encodes them as one batch and
+    hands each caller its vector.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_wait_ms: float = 5, max_batch_size: int = 32):
+        self.embeddings = embeddings
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.requests = queue.Queue()
+        self.worker = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.batched_requests = 0
+
+    def ensure_worker(self):
+        """Start the batching thread on first use (after any gunicorn fork)."""
+        if self.worker is None or not self.worker.is_alive():
+            with self.lock:
+                if self.worker is None or not self.worker.is_alive():
+                    self.worker = threading.Thread(target=self.run, name="embedding-batcher", daemon=True)
+                    self.worker.start()
+
+    def collect_batch(self):
+        """Block for one request, then gather more until the window closes or the batch is full."""
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.collect_batch()
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                logger.error(f"Error embedding batch of {len(texts)}: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_requests += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def embed_query(self, text: str) -> List[float]:
+        self.ensure_worker()
+        future = Future()
+        self.requests.put((text, future))
+        return future.result()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Callers passing many texts already batch; go straight to the model
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self) -> dict:
+        """Return the number of batches encoded and their mean size."""
+        return {
+            "batches": self.batches,
+            "requests": self.batched_requests,
+            "mean_batch_size": round(self.batched_requests / self.batches, 2) if self.batches else 0.0,
+            "queued": self.requests.qsize(),
+            "max_wait_ms": self.max_wait * 1000,
+            "max_batch_size": self.max_batch_size,
+        }
@@ -0,0 +1,255 @@
+"""Build and benchmark alternative FAISS index types for the therapist-reply store.
+
+The flat index in ``faiss_therapist_replies`` is the exact baseline. Other
+index types are rebuilt from its stored vectors (no re-embedding) and saved
+next to it as ``faiss_therapist_replies_<type>`` in the same LangChain
+format, so ``get_retriever`` can load any of them via FAISS_INDEX_TYPE.
+
+Usage (from the repository root):
+
+    python faiss_index.py build --type hnsw [--m 32] [--ef-construction 200]
+    python faiss_index.py build --type ivf_flat [--nlist 256]
+    python faiss_index.py build --type ivf_pq [--nlist 256] [--pq-m 48]
+    python faiss_index.py bench --type hnsw ivf_flat ivf_pq [--k 2] [--queries queries.txt]
+    python faiss_index.py migrate [--type flat] [--remove-pickle]
+
+``migrate`` converts index.pkl into the compact docstore used when
+FAISS_LOAD_MODE=mmap (see compact_docstore.py).
+
+Incremental ingestion (ingest.py) writes new snapshots under
+``<index dir>/snapshots/<name>`` and atomically repoints ``<index dir>/CURRENT``
+at them; every loader here resolves that pointer first.
+"""
+import argparse
+import logging
+import math
+import os
+import time
+import faiss
+import numpy as np
+from config import FAISS_INDEX_DIR, FAISS_INDEX_TYPE, FAISS_NPROBE, FAISS_EF_SEARCH, FAISS_LOAD_MODE
+from compact_docstore import MmapDocstore, PositionalIds, has_compact_docstore, write_compact_docstore
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+def get_index_path(index_type: str = FAISS_INDEX_TYPE) -> str:
+    """Return the on-disk directory for an index type."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type '{index_type}'. Choose from: {', '.join(INDEX_TYPES)}")
+    return FAISS_INDEX_DIR if index_type == "flat" else f"{FAISS_INDEX_DIR}_{index_type}"
+
+def configure_search(index, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH):
+    """Apply query-time parameters (nprobe for IVF, efSearch for HNSW) to a loaded index."""
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = nprobe
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    return index
+
+CURRENT_FILE = "CURRENT"
+SNAPSHOTS_DIR = "snapshots"
+
+def current_snapshot(path: str) -> str:
+    """Return the active snapshot directory for an index path (the path itself until the first ingestion)."""
+    try:
+        with open(os.path.join(path, CURRENT_FILE), encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return path
+    return os.path.join(path, SNAPSHOTS_DIR, name) if name else path
+
+def publish_snapshot(path: str, name: str):
+    """Atomically point CURRENT at a fully written snapshot."""
+    tmp = os.path.join(path, CURRENT_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(path, CURRENT_FILE))
+
+def default_nlist(ntotal: int) -> int:
+    """Rule-of-thumb IVF list count (~4*sqrt(n)), kept small enough to train on the corpus."""
+    return max(1, min(int(4 * math.sqrt(ntotal)), ntotal // 39 or 1))
+
+def build_index(vectors: np.ndarray, index_type: str, metric: int = faiss.METRIC_L2,
+                nlist: int = None, m: int = 32, ef_construction: int = 200, pq_m: int = 48):
+    """Build a trained and populated FAISS index of the given type from raw vectors."""
+    ntotal, dim = vectors.shape
+    if index_type == "flat":
+        index = faiss.IndexFlat(dim, metric)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, m, metric)
+        index.hnsw.efConstruction = ef_construction
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = nlist or default_nlist(ntotal)
+        quantizer = faiss.IndexFlat(dim, metric)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        else:
+            if dim % pq_m:
+                raise ValueError(f"pq_m={pq_m} must divide the vector dimension {dim}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, 8, metric)
+        index.train(vectors)
+    else:
+        raise ValueError(f"Unknown FAISS index type '{index_type}'. Choose from: {', '.join(INDEX_TYPES)}")
+    index.add(vectors)
+    return configure_search(index)
+
+def load_flat_store():
+    """Load the flat baseline LangChain vector store without an embedding model."""
+    path = current_snapshot(get_index_path("flat"))
+    load_mode = "pickle" if os.path.exists(os.path.join(path, "index.pkl")) else "mmap"
+    return load_vector_store(path, embeddings=None, load_mode=load_mode)
+
+def save_vector_store(store, path: str):
+    """Save a vector store in the format it was loaded from."""
+    if isinstance(store.docstore, MmapDocstore):
+        os.makedirs(path, exist_ok=True)
+        faiss.write_index(store.index, os.path.join(path, "index.faiss"))
+        write_compact_docstore(path, store.docstore.records())
+    else:
+        store.save_local(path)
+
+def read_index_mmap(path: str):
+    """Read index.faiss memory-mapped and read-only so forked workers share its pages.
+
+    IVF inverted lists are always mapped; flat codes are mapped too on FAISS
+    builds that provide IO_FLAG_MMAP_IFC.
+    """
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    return faiss.read_index(os.path.join(path, "index.faiss"), flags)
+
+def load_vector_store(path: str, embeddings, load_mode: str = FAISS_LOAD_MODE):
+    """Load a LangChain FAISS store, from the pickled docstore or the compact mmapped one."""
+    from langchain_community.vectorstores import FAISS
+    if load_mode == "mmap":
+        if has_compact_docstore(path):
+            index = configure_search(read_index_mmap(path))
+            return FAISS(
+                embedding_function=embeddings,
+                index=index,
+                docstore=MmapDocstore(path),
+                index_to_docstore_id=PositionalIds(index.ntotal)
+            )
+        logger.warning(f"No compact docstore in {path}; run 'python faiss_index.py migrate'. Falling back to index.pkl")
+    store = FAISS.load_local(path, embeddings=embeddings, allow_dangerous_deserialization=True)
+    configure_search(store.index)
+    return store
+
+def index_vectors(index) -> np.ndarray:
+    """Return all stored vectors of a flat index as a float32 matrix."""
+    return index.reconstruct_n(0, index.ntotal).astype("float32")
+
+def index_memory_bytes(index) -> int:
+    """Approximate the memory footprint of an index by its serialized size."""
+    return int(faiss.serialize_index(index).nbytes)
+
+def build_command(args):
+    store = load_flat_store()
+    vectors = index_vectors(store.index)
+    start = time.perf_counter()
+    store.index = build_index(vectors, args.type, metric=store.index.metric_type, nlist=args.nlist,
+                              m=args.m, ef_construction=args.ef_construction, pq_m=args.pq_m)
+    elapsed = time.perf_counter() - start
+    out = args.out or get_index_path(args.type)
+    save_vector_store(store, out)
+    if os.path.exists(os.path.join(out, CURRENT_FILE)):
+        os.remove(os.path.join(out, CURRENT_FILE))  # The fresh build supersedes ingested snapshots
+    print(f"✅ Built {args.type} index over {len(vectors)} vectors in {elapsed:.2f}s -> {out}")
+
+def migrate_command(args):
+    path = current_snapshot(get_index_path(args.type))
+    store = load_vector_store(path, embeddings=None, load_mode="pickle")
+    records = (
+        (store.index_to_docstore_id[i], store.docstore.search(store.index_to_docstore_id[i]))
+        for i in range(store.index.ntotal)
+    )
+    count = write_compact_docstore(path, records)
+    print(f"✅ Wrote compact docstore with {count} documents to {path}")
+    if args.remove_pickle:
+        os.remove(os.path.join(path, "index.pkl"))
+        print(f"🗑️ Removed {os.path.join(path, 'index.pkl')}")
+
+def load_queries(args, vectors: np.ndarray) -> np.ndarray:
+    """Embed queries from a text file, or sample noisy corpus vectors when none is given."""
+    if args.queries:
+        from utils import get_embedding_model
+        with open(args.queries, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        return np.asarray(get_embedding_model().embed_documents(texts), dtype="float32")
+    rng = np.random.default_rng(args.seed)
+    sample = vectors[rng.choice(len(vectors), size=min(args.num_queries, len(vectors)), replace=False)]
+    noise = rng.normal(scale=args.noise * float(np.std(vectors)), size=sample.shape)
+    return (sample + noise).astype("float32")
+
+def search_latencies(index, queries: np.ndarray, k: int):
+    """Search one query at a time (as the chat path does) and return (ids, latencies in ms)."""
+    ids = np.empty((len(queries), k), dtype="int64")
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids[i] = index.search(query.reshape(1, -1), k)
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return ids, latencies
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Fraction of the exact top-k neighbours that the approximate search returned."""
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def bench_command(args):
+    store = load_flat_store()
+    flat = store.index
+    vectors = index_vectors(flat)
+    queries = load_queries(args, vectors)
+    truth, _ = search_latencies(flat, queries, args.k)
+
+    print(f"{len(vectors)} vectors, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<10}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}{'memory MiB':>12}")
+    for index_type in ["flat"] + [t for t in args.type if t != "flat"]:
+        path = current_snapshot(get_index_path(index_type))
+        if index_type == "flat":
+            index = flat
+        elif os.path.exists(os.path.join(path, "index.faiss")):
+            index = configure_search(faiss.read_index(os.path.join(path, "index.faiss")))
+        else:
+            index = build_index(vectors, index_type, metric=flat.metric_type)
+        found, latencies = search_latencies(index, queries, args.k)
+        print(f"{index_type:<10}{recall_at_k(found, truth):>10.3f}{np.percentile(latencies, 50):>10.3f}"
+              f"{np.percentile(latencies, 99):>10.3f}{index_memory_bytes(index) / 2**20:>12.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Rebuild the therapist-reply index as another type")
+    build.add_argument("--type", choices=INDEX_TYPES, required=True)
+    build.add_argument("--out", help="Output directory (default: faiss_therapist_replies_<type>)")
+    build.add_argument("--nlist", type=int, help="IVF list count (default ~4*sqrt(n))")
+    build.add_argument("--m", type=int, default=32, help="HNSW neighbours per node")
+    build.add_argument("--ef-construction", type=int, default=200)
+    build.add_argument("--pq-m", type=int, default=48, help="PQ sub-quantizers (must divide the dimension)")
+    build.set_defaults(func=build_command)
+
+    bench = commands.add_parser("bench", help="Report recall@k, latency and memory against the flat index")
+    bench.add_argument("--type", choices=INDEX_TYPES, nargs="+", default=list(INDEX_TYPES[1:]))
+    bench.add_argument("--k", type=int, default=2)
+    bench.add_argument("--queries", help="Text file with one query per line (embedded with the chat model)")
+    bench.add_argument("--num-queries", type=int, default=500)
+    bench.add_argument("--noise", type=float, default=0.1, help="Noise scale for sampled corpus queries")
+    bench.add_argument("--seed", type=int, default=0)
+    bench.set_defaults(func=bench_command)
+
+    migrate = commands.add_parser("migrate", help="Convert index.pkl into the compact mmap-able docstore")
+    migrate.add_argument("--type", choices=INDEX_TYPES, default="flat")
+    migrate.add_argument("--remove-pickle", action="store_true", help="Delete index.pkl after converting")
+    migrate.set_defaults(func=migrate_command)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
@@ -0,0 +1,215 @@
+"""Incremental ingestion into the therapist-reply vector store.
+
+New reply documents are embedded (only the new ones), appended to a copy of
+the active index and docstore, written as a new snapshot and published by
+atomically repointing CURRENT. Running workers notice the new snapshot within
+FAISS_RELOAD_INTERVAL seconds and reload without a restart.
+
+Usage (from the repository root):
+
+    python ingest.py [--type flat] [--batch-size 256]
+
+ingests AI responses that received "like" feedback and have not been ingested
+yet; progress is tracked in the ``vector_ingestion`` collection. Each batch
+is claimed there (status "claimed") before it is embedded, so concurrent runs
+never ingest the same response twice; a run that crashes mid-batch leaves
+claims behind, which can be cleared with
+``db.vector_ingestion.deleteMany({status: "claimed"})`` once no run is active.
+"""
+import argparse
+import datetime
+import fcntl
+import logging
+import os
+import pickle
+import shutil
+import uuid
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from config import FAISS_INDEX_TYPE, FAISS_SNAPSHOTS_KEEP
+from compact_docstore import has_compact_docstore, append_compact_docstore
+from faiss_index import get_index_path, current_snapshot, publish_snapshot, SNAPSHOTS_DIR
+from pymongo.errors import BulkWriteError
+from database.models import split_message
+
+logger = logging.getLogger(__name__)
+
+def prune_snapshots(path: str, keep: int = FAISS_SNAPSHOTS_KEEP):
+    """Delete all but the newest `keep` snapshots, never the active one.
+
+    Workers that still have an old snapshot mapped keep reading it until they
+    reload; unlinked files stay valid for open mappings.
+    """
+    snapshots_dir = os.path.join(path, SNAPSHOTS_DIR)
+    if not os.path.isdir(snapshots_dir):
+        return
+    active = os.path.basename(current_snapshot(path))
+    for name in sorted(os.listdir(snapshots_dir))[:-keep or None]:
+        if name != active:
+            shutil.rmtree(os.path.join(snapshots_dir, name), ignore_errors=True)
+
+def ingest_documents(texts, metadatas=None, index_type: str = FAISS_INDEX_TYPE, embeddings=None) -> str:
+    """Embed and append documents to the live index as a new snapshot; return its directory."""
+    if not texts:
+        return None
+    if embeddings is None:
+        from utils import get_embedding_model
+        embeddings = get_embedding_model()
+    metadatas = metadatas or [{} for _ in texts]
+
+    path = get_index_path(index_type)
+    os.makedirs(os.path.join(path, SNAPSHOTS_DIR), exist_ok=True)
+    with open(os.path.join(path, "ingest.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # One writer at a time per index
+
+        source = current_snapshot(path)
+        vectors = np.asarray(embeddings.embed_documents(list(texts)), dtype="float32")
+        records = [(str(uuid.uuid4()), Document(page_content=text, metadata=metadata))
+                   for text, metadata in zip(texts, metadatas)]
+
+        name = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        target = os.path.join(path, SNAPSHOTS_DIR, name)
+        os.makedirs(target)
+
+        index = faiss.read_index(os.path.join(source, "index.faiss"))
+        start = index.ntotal
+        index.add(vectors)
+        faiss.write_index(index, os.path.join(target, "index.faiss"))
+
+        if has_compact_docstore(source):
+            append_compact_docstore(source, target, records)
+        if os.path.exists(os.path.join(source, "index.pkl")):
+            with open(os.path.join(source, "index.pkl"), "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+            docstore.add({doc_id: doc for doc_id, doc in records})
+            for offset, (doc_id, _) in enumerate(records):
+                index_to_docstore_id[start + offset] = doc_id
+            with open(os.path.join(target, "index.pkl"), "wb") as f:
+                pickle.dump((docstore, index_to_docstore_id), f)
+
+        publish_snapshot(path, name)
+        prune_snapshots(path)
+
+    logger.info(f"Ingested {len(records)} documents into {target} ({index.ntotal} total)")
+    return target
+
+def pending_liked_responses(db, limit: int):
+    """Return up to `limit` liked (response_id, session_id) pairs not yet ingested."""
+    liked = db["feedback_responses"].aggregate([
+        {"$unwind": "$feedbacks"},
+        {"$match": {"feedbacks.feedback_type": "like"}},
+        {"$group": {"_id": "$feedbacks.response_id", "session_id": {"$first": "$session_id"}}},
+        {"$lookup": {"from": "vector_ingestion", "localField": "_id", "foreignField": "_id", "as": "ingested"}},
+        {"$match": {"ingested": {"$size": 0}}},
+        {"$limit": limit},
+    ])
+    return [(item["_id"], item["session_id"]) for item in liked]
+
+def find_replies(db, pending) -> tuple:
+    """Return ({response_id: text}, response_ids that are settled) for pending (response_id, session_id) pairs.
+
+    Sessions not yet moved by `database.migrations chat_messages` keep their
+    replies in the embedded chat_history.messages array. That array is read
+    before chat_messages: the migration writes chat_messages before it unsets
+    the array, so a reply moved in between is still found by one of the two
+    reads. A reply that is found nowhere is only settled (marked as done)
+    once its session is confirmed migrated; otherwise it is retried.
+    """
+    response_ids = [response_id for response_id, _ in pending]
+    wanted = set(response_ids)
+    texts, unmigrated = {}, set()
+    sessions = db["chat_history"].find(
+        {"session_id": {"$in": list({session_id for _, session_id in pending})}, "messages.0": {"$exists": True}},
+        {"session_id": 1, "messages": 1}
+    )
+    for session in sessions:
+        unmigrated.add(session["session_id"])
+        for msg in session["messages"]:
+            fields = split_message(msg)
+            if fields["role"] == "AI" and fields.get("response_id") in wanted and fields.get("message"):
+                texts[fields["response_id"]] = fields["message"]
+
+    replies = db["chat_messages"].find(
+        {"response_id": {"$in": response_ids}, "role": "AI"},
+        {"response_id": 1, "message": 1}
+    )
+    for reply in replies:
+        if reply.get("message"):
+            texts.setdefault(reply["response_id"], reply["message"])
+
+    settled = [response_id for response_id, session_id in pending
+               if response_id in texts or session_id not in unmigrated]
+    return texts, settled
+
+DUPLICATE_KEY = 11000
+
+def claim_responses(db, response_ids: list) -> set:
+    """Insert "claimed" markers for response_ids; return the ids this run won (others belong to another run)."""
+    now = datetime.datetime.utcnow()
+    try:
+        db["vector_ingestion"].insert_many(
+            [{"_id": response_id, "status": "claimed", "claimed_at": now} for response_id in response_ids],
+            ordered=False
+        )
+        return set(response_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        return set(response_ids) - {error["op"]["_id"] for error in errors}
+
+def release_claims(db, response_ids):
+    if response_ids:
+        db["vector_ingestion"].delete_many({"_id": {"$in": list(response_ids)}, "status": "claimed"})
+
+def ingest_liked_responses(db, index_type: str = FAISS_INDEX_TYPE, batch_size: int = 256) -> int:
+    """Ingest liked AI responses in batches; return how many were added."""
+    total = 0
+    while True:
+        pending = pending_liked_responses(db, batch_size)
+        if not pending:
+            return total
+        claimed = claim_responses(db, [response_id for response_id, _ in pending])
+        pending = [(response_id, session_id) for response_id, session_id in pending if response_id in claimed]
+        if not pending:
+            continue  # Another run claimed the whole batch; the next query skips those ids
+        try:
+            found, settled = find_replies(db, pending)
+            texts = list(found.values())
+            metadatas = [{"response_id": response_id, "source": "liked_feedback"} for response_id in found]
+            snapshot = ingest_documents(texts, metadatas, index_type=index_type)
+        except BaseException:
+            release_claims(db, claimed)
+            raise
+
+        # Responses whose text is gone from a migrated session are marked too, so they are not retried forever
+        db["vector_ingestion"].update_many(
+            {"_id": {"$in": settled}},
+            {"$set": {"status": "ingested", "ingested_at": datetime.datetime.utcnow(), "snapshot": snapshot},
+             "$unset": {"claimed_at": ""}}
+        )
+        release_claims(db, claimed - set(settled))
+        total += len(texts)
+        if len(settled) < len(pending):
+            logger.info(f"{len(pending) - len(settled)} liked responses not found in unmigrated sessions; will retry")
+            return total  # Don't spin on the same unsettled ids
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--type", default=FAISS_INDEX_TYPE, help="Index type to ingest into")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    from flask import Flask
+    from database.models import init_db, get_database
+    app = Flask(__name__)
+    if not init_db(app):
+        raise SystemExit("❌ Database initialization failed")
+
+    count = ingest_liked_responses(get_database(), index_type=args.type, batch_size=args.batch_size)
+    print(f"✅ Ingested {count} liked responses")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
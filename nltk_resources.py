@@ -0,0 +1,99 @@
+"""NLTK tokenizer and stopwords for keyword extraction, resolved without network I/O at import.
+
+Resources are looked up in NLTK_DATA_DIR (vendored into the image once with
+``python -m nltk_resources``) and then NLTK's usual search path, the first
+time they are needed. Nothing is downloaded at runtime unless
+NLTK_AUTO_DOWNLOAD is set. If a resource is missing, callers get a regex
+tokenizer and a built-in stopword list instead, so air-gapped workers still
+boot and serve.
+
+Usage (from the repository root, e.g. in the image build):
+
+    python -m nltk_resources [--dir nltk_data]
+"""
+import argparse
+import logging
+import os
+import re
+import threading
+from config import NLTK_DATA_DIR, NLTK_AUTO_DOWNLOAD
+
+logger = logging.getLogger(__name__)
+
+PACKAGES = ("punkt", "punkt_tab", "stopwords")  # punkt_tab is what word_tokenize loads on NLTK >= 3.8.2
+
+FALLBACK_STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between both
+but by can did do does doing down during each few for from further had has have having he her here hers herself
+him himself his how i if in into is it its itself just me more most my myself no nor not now of off on once only
+or other our ours ourselves out over own same she should so some such than that the their theirs them themselves
+then there these they this those through to too under until up very was we were what when where which while who
+whom why will with you your yours yourself yourselves
+""".split())
+
+tokenizer = None
+stop_words = None
+resources_lock = threading.Lock()
+
+def regex_tokenize(text: str) -> list:
+    return re.findall(r"\w+|[^\w\s]", text)
+
+def load_resources():
+    """Resolve the tokenizer and stopwords once per process."""
+    global tokenizer, stop_words
+    import nltk  # Deferred: importing nltk alone costs noticeable startup time
+    from nltk.corpus import stopwords
+    from nltk.tokenize import word_tokenize
+
+    if os.path.isdir(NLTK_DATA_DIR) and NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+    def resolve(probe, packages):
+        try:
+            return probe()
+        except LookupError:
+            if not NLTK_AUTO_DOWNLOAD:
+                raise
+            for package in packages:
+                nltk.download(package, quiet=True)
+            return probe()
+
+    try:
+        resolve(lambda: word_tokenize("probe"), ("punkt", "punkt_tab"))
+        tokenizer = word_tokenize
+    except LookupError:
+        logger.warning("NLTK punkt not found; using the regex tokenizer (run `python -m nltk_resources`)")
+        tokenizer = regex_tokenize
+    try:
+        stop_words = frozenset(resolve(lambda: stopwords.words("english"), ("stopwords",)))
+    except LookupError:
+        logger.warning("NLTK stopwords not found; using the built-in list (run `python -m nltk_resources`)")
+        stop_words = FALLBACK_STOPWORDS
+
+def get_tokenizer():
+    if tokenizer is None:
+        with resources_lock:
+            if tokenizer is None:
+                load_resources()
+    return tokenizer
+
+def get_stop_words() -> frozenset:
+    if stop_words is None:
+        with resources_lock:
+            if stop_words is None:
+                load_resources()
+    return stop_words
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=NLTK_DATA_DIR, help="Directory to vendor the NLTK data into")
+    args = parser.parse_args()
+
+    import nltk
+    for package in PACKAGES:
+        if not nltk.download(package, download_dir=args.dir, quiet=True, raise_on_error=True):
+            raise SystemExit(f"❌ Could not download NLTK package '{package}'")
+        print(f"✅ {package} -> {args.dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Password hashing off the request thread.
+
+werkzeug's KDFs are deliberately CPU-bound, so they run in a small process
+pool instead of on the worker thread serving the request. At most
+PASSWORD_HASH_QUEUE_LIMIT hashes may be queued or running per process; past
+that, callers get HashingBusy immediately and the route answers 503 rather
+than letting a login burst starve chat traffic.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT, PASSWORD_HASH_TIMEOUT
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full; the caller should retry later."""
+
+def hash_method(password_hash: str) -> str:
+    """The method part of a werkzeug hash, e.g. "scrypt:32768:8:1"."""
+    return password_hash.split("$", 1)[0]
+
+# These run in the pool's worker processes, so they must stay module-level.
+
+def stored_method_task(method: str) -> str:
+    """The full method werkzeug writes for `method` ("scrypt" is stored as "scrypt:32768:8:1")."""
+    return hash_method(generate_password_hash("x", method=method))
+
+def hash_task(password: str, method: str) -> str:
+    return generate_password_hash(password, method=method)
+
+def verify_task(password_hash: str, password: str, method: str, stored_method: str):
+    """Check a password; also return a new hash when the stored one uses an old method."""
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if hash_method(password_hash) != stored_method:
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+class PasswordHasher:
+    """Bounded process pool for password hashing, created lazily (after any gunicorn fork).
+
+    Pool processes are started with forkserver, so a multi-threaded app
+    worker (embedding batcher, write-behind, pipeline threads, torch) is never
+    forked. A pool whose child died (e.g. OOM-killed) is replaced.
+    """
+
+    def __init__(self, workers: int, queue_limit: int, timeout: float, method: str):
+        self.workers = workers
+        self.timeout = timeout
+        self.method = method
+        self.stored_method = None  # Normalized form of method, resolved in the pool on first use
+        self.executor = None
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(queue_limit)
+        self.completed = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    def get_executor(self):
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                        mp_context=multiprocessing.get_context("forkserver"))
+        return self.executor
+
+    def reset_executor(self, broken):
+        """Replace a broken pool; concurrent callers that saw the same pool replace it only once."""
+        with self.lock:
+            if self.executor is broken:
+                self.executor = None
+                self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn, *args):
+        """Submit fn, holding a queue slot until the task really finishes (not just until we stop waiting)."""
+        if not self.slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingBusy("Too many password operations in progress")
+        try:
+            future = self.get_executor().submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def run(self, fn, *args, retry: bool = True):
+        """Run fn in the pool and wait for it; raise HashingBusy if the queue is full or the wait times out."""
+        executor = self.get_executor()
+        try:
+            future = self.submit(fn, *args)
+            try:
+                result = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()  # Only helps if still queued; a running task keeps its slot until done
+                self.rejected += 1
+                raise HashingBusy("Password operation timed out")
+        except BrokenProcessPool:
+            self.reset_executor(executor)
+            if retry:
+                return self.run(fn, *args, retry=False)
+            self.rejected += 1
+            raise HashingBusy("Password hashing pool is restarting")
+        self.completed += 1
+        return result
+
+    def get_stored_method(self) -> str:
+        if self.stored_method is None:
+            self.stored_method = self.run(stored_method_task, self.method)
+        return self.stored_method
+
+    def hash(self, password: str) -> str:
+        return self.run(hash_task, password, self.method)
+
+    def verify(self, password_hash: str, password: str):
+        """Return (matches, new_hash); new_hash is set when the stored hash should be replaced."""
+        if not password_hash:
+            return False, None
+        return self.run(verify_task, password_hash, password, self.method, self.get_stored_method())
+
+    def stats(self) -> dict:
+        return {"method": self.method, "stored_method": self.stored_method, "completed": self.completed,
+                "rejected": self.rejected, "restarts": self.restarts}
+
+hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT, PASSWORD_HASH_TIMEOUT, PASSWORD_HASH_METHOD)
+
+def hash_password(password: str) -> str:
+    return hasher.hash(password)
+
+def verify_password(password_hash: str, password: str):
+    return hasher.verify(password_hash, password)
@@ -0,0 +1,164 @@
+"""Profile photo processing and storage.
+
+An upload is decoded once and re-encoded as JPEG at each size in
+RENDITIONS; the original is not kept. All renditions of a photo share a
+``parent_id`` in GridFS, and the largest one is stored under that id, so
+the id saved on the user document is served as-is by default and
+``?size=<name>`` selects another rendition. Uploads are deduplicated on the
+SHA-256 of the uploaded bytes, and a photo no user references any more is
+deleted together with its renditions.
+
+Small photos are also kept in a per-process, byte-budgeted LRU keyed by
+file id (and size). File ids are immutable, so entries never go stale.
+"""
+import datetime
+import hashlib
+import logging
+from collections import namedtuple
+from io import BytesIO
+import gridfs
+from bson import ObjectId
+from PIL import Image, ImageOps, UnidentifiedImageError
+from caching import LRUCache
+from config import PHOTO_MEMORY_CACHE_BYTES, PHOTO_MEMORY_CACHE_ITEM_BYTES
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {"small": 64, "medium": 256, "large": 512}  # Name -> max edge in pixels
+DEFAULT_RENDITION = "large"
+JPEG_QUALITY = 85
+REUSE_GRACE = datetime.timedelta(minutes=10)  # A reused photo is kept this long so the reusing user can reference it
+
+# Same attribute names as GridOut, so responses are built the same way from either
+CachedPhoto = namedtuple("CachedPhoto", "data content_type filename upload_date")
+
+photo_cache = LRUCache(
+    max_entries=1_000_000,  # Bounded by bytes, not count
+    max_bytes=PHOTO_MEMORY_CACHE_BYTES,
+    sizeof=lambda photo: len(photo.data)
+) if PHOTO_MEMORY_CACHE_BYTES > 0 else None
+
+class InvalidImage(ValueError):
+    """The upload could not be decoded as an image."""
+
+def render(image: Image.Image, max_edge: int) -> bytes:
+    """Downscale (never upscale) to fit max_edge and encode as progressive JPEG."""
+    rendition = image.copy()
+    rendition.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    out = BytesIO()
+    rendition.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+def decode(data: bytes) -> Image.Image:
+    """Open an upload, apply its EXIF orientation and flatten it onto white RGB."""
+    try:
+        image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+        if image.mode not in ("RGBA", "LA", "P"):
+            return image.convert("RGB")
+        image = image.convert("RGBA")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidImage(str(e)) from e
+    background = Image.new("RGB", image.size, "white")
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+def store_photo(db, user_id: str, data: bytes, filename: str = None) -> str:
+    """Store an upload's renditions in GridFS (or reuse an identical earlier upload); return the photo id."""
+    digest = hashlib.sha256(data).hexdigest()
+    # Marking the reuse makes a concurrent delete_photo of the same photo back off (see there)
+    existing = db["fs.files"].find_one_and_update(
+        {"source_sha256": digest, "rendition": DEFAULT_RENDITION},
+        {"$set": {"reused_at": datetime.datetime.utcnow()}},
+        projection={"_id": 1}
+    )
+    if existing:
+        logger.info(f"Reusing photo {existing['_id']} for identical upload from user {user_id}")
+        return str(existing["_id"])
+
+    image = decode(data)
+    fs = gridfs.GridFS(db)
+    photo_id = ObjectId()
+    for name, max_edge in RENDITIONS.items():
+        metadata = {"parent_id": photo_id, "rendition": name, "source_sha256": digest,
+                    "filename": filename, "content_type": "image/jpeg", "user_id": user_id}
+        if name == DEFAULT_RENDITION:
+            metadata["_id"] = photo_id
+        fs.put(render(image, max_edge), **metadata)
+    return str(photo_id)
+
+def find_rendition(fs: gridfs.GridFS, photo_id: ObjectId, size: str = None):
+    """Return the GridOut for a photo's rendition; photos stored before renditions only have themselves."""
+    if size and size != DEFAULT_RENDITION:
+        grid_out = fs.find_one({"parent_id": photo_id, "rendition": size})
+        if grid_out is not None:
+            return grid_out
+    return fs.get(photo_id)
+
+def cache_photo(key: str, grid_out):
+    """Read a small GridOut fully into the photo cache; return the CachedPhoto, or None if not cacheable."""
+    if photo_cache is None or grid_out.length > PHOTO_MEMORY_CACHE_ITEM_BYTES:
+        return None
+    photo = CachedPhoto(grid_out.read(), grid_out.content_type, grid_out.filename, grid_out.upload_date)
+    photo_cache.put(key, photo)
+    return photo
+
+def get_cached_photo(key: str):
+    return photo_cache.get(key) if photo_cache is not None else None
+
+def photo_cache_stats() -> dict:
+    return photo_cache.stats() if photo_cache is not None else {"enabled": False}
+
+def delete_photo(db, photo_id: str) -> int:
+    """Delete a photo and all its renditions unless some user still references it; return files removed.
+
+    An identical upload can reuse the photo after the reference check but
+    before the reusing user's document is updated. store_photo marks the
+    reuse first, and the primary file is only deleted if no reuse was marked
+    within REUSE_GRACE, in one atomic find_one_and_delete. Whichever comes
+    first wins: either the reuse finds no photo and stores a fresh copy, or
+    the delete backs off.
+    """
+    if not ObjectId.is_valid(photo_id) or db["users"].count_documents({"profile_photo": photo_id}, limit=1):
+        return 0
+    oid = ObjectId(photo_id)
+    cutoff = datetime.datetime.utcnow() - REUSE_GRACE
+    primary = db["fs.files"].find_one_and_delete(
+        {"_id": oid, "reused_at": {"$not": {"$gte": cutoff}}},
+        projection={"_id": 1}
+    )
+    if primary is None:
+        return 0
+    db["fs.chunks"].delete_many({"files_id": oid})
+    fs = gridfs.GridFS(db)
+    renditions = [doc["_id"] for doc in db["fs.files"].find({"parent_id": oid}, {"_id": 1})]
+    for file_id in renditions:
+        fs.delete(file_id)  # Removes the file document and its chunks
+    return 1 + len(renditions)
+
+def collect_superseded(db, previous_photo_id: str):
+    """Best-effort cleanup of the photo a user just replaced."""
+    if not previous_photo_id:
+        return
+    try:
+        removed = delete_photo(db, previous_photo_id)
+        if removed:
+            logger.info(f"Deleted superseded photo {previous_photo_id} ({removed} files)")
+    except Exception as e:
+        logger.error(f"Could not delete superseded photo {previous_photo_id}: {e}")
+
+def collect_orphans(db, batch_size: int = None, grace_minutes: int = 60) -> int:
+    """Delete every photo no user references (one-off sweep of photos superseded before GC existed).
+
+    Photos uploaded in the last grace_minutes are skipped, since the user
+    document is updated just after the upload is stored.
+    """
+    referenced = set(db["users"].distinct("profile_photo"))
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(minutes=grace_minutes)
+    removed = 0
+    # Photos with renditions are found through their primary file; older uploads have no parent_id
+    query = {"uploadDate": {"$lt": cutoff},
+             "$or": [{"parent_id": {"$exists": False}}, {"rendition": DEFAULT_RENDITION}]}
+    for doc in db["fs.files"].find(query, {"_id": 1}):
+        if str(doc["_id"]) not in referenced:
+            removed += delete_photo(db, str(doc["_id"]))
+    return removed
@@ -0,0 +1,83 @@
+from flask import Blueprint, request, jsonify
+import hmac
+import logging
+from config import ADMIN_API_KEY
+from database import feedback_rollups
+from database.question_catalog import reload_question_catalog
+
+admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
+logger = logging.getLogger(__name__)
+
+MAX_DAYS = 366
+
+@admin_bp.before_request
+def require_admin_key():
+    """Allow admin endpoints only with the configured X-Admin-Key."""
+    key = request.headers.get("X-Admin-Key", "")
+    if not ADMIN_API_KEY or not hmac.compare_digest(key, ADMIN_API_KEY):
+        return jsonify({"error": "Forbidden"}), 403
+
+def get_days():
+    """Parse ?days= (default 30), capped at MAX_DAYS."""
+    try:
+        return min(max(int(request.args.get("days", 30)), 1), MAX_DAYS)
+    except ValueError:
+        return None
+
+@admin_bp.route("/feedback/daily", methods=["GET"])
+def feedback_daily():
+    """Like/dislike ratio and average daily rating per day."""
+    days = get_days()
+    if days is None:
+        return jsonify({"error": "days must be an integer."}), 400
+    try:
+        return jsonify({"days": feedback_rollups.daily_stats(days)}), 200
+    except Exception as e:
+        logger.error(f"Error reading daily feedback rollups: {e}")
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+
+@admin_bp.route("/feedback/cohorts", methods=["GET"])
+def feedback_cohorts():
+    """Per-day feedback stats for each signup-month cohort (optionally ?cohort=YYYY-MM)."""
+    days = get_days()
+    if days is None:
+        return jsonify({"error": "days must be an integer."}), 400
+    try:
+        return jsonify({"cohorts": feedback_rollups.cohort_stats(days, request.args.get("cohort"))}), 200
+    except Exception as e:
+        logger.error(f"Error reading cohort feedback rollups: {e}")
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+
+@admin_bp.route("/feedback/responses", methods=["GET"])
+def feedback_responses():
+    """Stats for ?response_id=... (repeatable), or the most liked/disliked responses (?sort=likes|dislikes&limit=)."""
+    response_ids = request.args.getlist("response_id")
+    sort = request.args.get("sort", "dislikes")
+    if sort not in ("likes", "dislikes"):
+        return jsonify({"error": "sort must be 'likes' or 'dislikes'."}), 400
+    try:
+        limit = min(int(request.args.get("limit", 50)), 500)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer."}), 400
+    try:
+        return jsonify({"responses": feedback_rollups.response_stats(response_ids, limit, sort)}), 200
+    except Exception as e:
+        logger.error(f"Error reading response feedback rollups: {e}")
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+
+@admin_bp.route("/questions/reload", methods=["POST"])
+def questions_reload():
+    """Reload this worker's question catalog after the question bank changes."""
+    try:
+        catalog = reload_question_catalog()
+    except Exception as e:
+        logger.error(f"Error reloading question catalog: {e}")
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+    return jsonify({"questions": len(catalog), "categories": len(catalog.categories)}), 200
+
+@admin_bp.route("/chain/reset", methods=["POST"])
+def chain_reset():
+    """Rebuild this worker's LLM and chains on next use, re-reading GROQ_API_KEY/GROQ_MODEL_NAME from .env."""
+    from utils import reset_chain  # Deferred: utils pulls in LangChain
+    reset_chain()
+    return jsonify({"status": "reset"}), 200
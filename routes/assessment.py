@@ -1,38 +1,30 @@
 from flask import Blueprint, request, jsonify
 import datetime
 from routes.auth import verify_jwt_token
-from database.models import question_collection  #Import question_collection
+from database.question_catalog import get_question_catalog
+from database.assessment_store import get_assessment_store
+from database.assessment_results import record_result, get_trends
 
 assessment_bp = Blueprint("assessment", __name__, url_prefix="/api/assessment")
 
-# Store temporary assessments
-ongoing_assessments = {}  # {user_id: {"category": "lonely", "question_ids": [], "answers": [], "timestamp": datetime}}
-
 SESSION_EXPIRY_MINUTES = 10  # Expire sessions after 10 minutes
 
-def cleanup_expired_sessions():
-    """Remove expired sessions based on SESSION_EXPIRY_MINUTES."""
-    now = datetime.datetime.utcnow()
-    expired_users = [
-        user_id for user_id, data in ongoing_assessments.items()
-        if (now - data["timestamp"]).total_seconds() > SESSION_EXPIRY_MINUTES * 60
-    ]
-    for user_id in expired_users:
-        del ongoing_assessments[user_id]
+def get_store():
+    """Return the assessment-state backend ({"category", "question_ids", "answers", "timestamp"} per user)."""
+    return get_assessment_store(SESSION_EXPIRY_MINUTES)
 
 def calculate_score(answers, question_ids):
     """Calculate the user's score based on their responses."""
+    scores = get_question_catalog().scores
     total_score = 0
     for question_id, answer in zip(question_ids, answers):
-        # Fetch the question from the database to get scores
-        question = question_collection.find_one({"_id": question_id})
-        if not question:
-            print(f"Warning: Question not found in DB: {question_id}") #Log this, don't expose to user.
-            continue  #Skip this question if it's not in the DB (error handling)
+        question_scores = scores.get(question_id)
+        if question_scores is None:
+            print(f"Warning: Question not found in catalog: {question_id}") #Log this, don't expose to user.
+            continue  #Skip this question if it's not in the catalog (error handling)
 
         try:
-            score = question['scores'][int(answer)] # Access the score based on the answer index
-            total_score += score
+            total_score += question_scores[int(answer)] # Access the score based on the answer index
         except (IndexError, ValueError) as e:
             print(f"Error calculating score for question {question_id}: {e}")
             continue #Skip this question
@@ -53,18 +45,18 @@ def start_assessment():
     if not user_id:
         return jsonify({"error": "Unauthorized access"}), 401
 
-    # Verify question_collection is available
-    if question_collection is None:
-        return jsonify({"error": "Database error: question_collection is not initialized."}), 500
-
-    # Cleanup expired sessions
-    cleanup_expired_sessions()
+    # Verify the question catalog is available
+    try:
+        get_question_catalog()
+    except Exception as e:
+        print(f"Error loading question catalog: {e}")
+        return jsonify({"error": "Database error: question catalog is not available."}), 500
 
     # First question
     first_question = "Which of these best describes your current state? (lonely, depressed, anxious)"
 
     # Start a new assessment session
-    ongoing_assessments[user_id] = {"category": None, "question_ids": [], "answers": [], "timestamp": datetime.datetime.utcnow()}
+    get_store().start(user_id)
 
     return jsonify({"question": first_question, "info": "Please type one of: Anger, Anxiety, Body Image, Depression, Finances, General Wellbeing, Grief, Guilt, Loneliness, Motivation, Relationships, Resilience, Self-Esteem, Sleep, Social Support, Spirituality, Stress, Substance Use, Trauma, Work/School."}), 200
 
@@ -78,58 +70,48 @@ def next_question():
     if not user_id or answer is None:
         return jsonify({"error": "Invalid request. Ensure user is authenticated and answer is provided."}), 400
 
-    # Verify question_collection is available
-    if question_collection is None:
-        return jsonify({"error": "Database connection error: question_collection is not initialized."}), 500
-
-    # Cleanup expired sessions
-    cleanup_expired_sessions()
+    # Verify the question catalog is available
+    try:
+        catalog = get_question_catalog()
+    except Exception as e:
+        print(f"Error loading question catalog: {e}")
+        return jsonify({"error": "Database connection error: question catalog is not available."}), 500
 
-    # Fetch user session
-    if user_id not in ongoing_assessments:
+    # Fetch user session (expired sessions are never returned)
+    store = get_store()
+    user_data = store.get(user_id)
+    if user_data is None:
         return jsonify({"error": "Session expired or assessment not started. Please restart."}), 400
 
-    user_data = ongoing_assessments[user_id]
-
     # If category is not set, determine category based on first answer
     if user_data["category"] is None:
-        category = answer.lower()
-        # print(category)
-
         # Validate Category
-        try:
-            valid_categories = question_collection.distinct("category")
-            valid_categories_lower = [cat.lower() for cat in valid_categories]
-        except Exception as e:
-            print(f"Error fetching distinct categories: {e}")
-            return jsonify({"error": "Error fetching categories from the database."}), 500
-
+        original_category = catalog.resolve_category(str(answer))
+        if original_category is None:
+            return jsonify({"error": f"Invalid category. Choose from: {', '.join(catalog.categories)}."}), 400
 
-        if category not in valid_categories_lower:
-            return jsonify({"error": f"Invalid category. Choose from: {', '.join(valid_categories)}."}), 400
-        
-        original_category = valid_categories[valid_categories_lower.index(category)]
-        user_data["category"] = original_category
-        user_data["question_ids"] = []
-        user_data["answers"] = []
-        user_data["timestamp"] = datetime.datetime.utcnow()  # Update session timestamp
-
-        # Get the first question from the database for this category
-        first_question_doc = question_collection.find_one({"category": original_category})  # Assuming you want the first one in the DB
+        # Get the first question for this category
+        first_question_doc = catalog.first_question(original_category)
         if not first_question_doc:
-            return jsonify({"error": "No questions found for this category in the database."}), 500 #Server error
+            return jsonify({"error": "No questions found for this category."}), 500 #Server error
 
-        user_data["question_ids"].append(first_question_doc["_id"])
-        return jsonify({"question": first_question_doc["question_text"], "options": first_question_doc.get("options")}), 200 #Include options
+        if not store.set_category(user_id, original_category, first_question_doc["_id"]):
+            return jsonify({"error": "Session expired or assessment not started. Please restart."}), 400
+        return jsonify({"question": first_question_doc["question_text"], "options": first_question_doc.get("options"),
+                        "question_id": str(first_question_doc["_id"])}), 200 #Include options
 
 
 
     # Store the user's answer (as index of selected option)
     try:
        score = int(answer)
-       # Find the last question asked
+       # The question being answered: the one the client echoes back, else the last one asked.
+       # Only an echoed id lets a replayed request be told apart from an answer to the next question.
        last_question_id = user_data["question_ids"][-1]
-       last_question = question_collection.find_one({"_id": last_question_id})
+       if data.get("question_id") is not None:
+           if str(last_question_id) != str(data["question_id"]):
+               return jsonify({"error": "Answer already recorded or session expired. Please continue or restart."}), 409
+       last_question = catalog.get(last_question_id)
 
        if not last_question or 'options' not in last_question:
           return jsonify({"error": "Invalid question or options not found."}), 500
@@ -137,9 +119,6 @@ def next_question():
        if not (0 <= score < len(last_question['options'])): # Check if score is a valid index for the options
            return jsonify({"error": "Response must be a valid option index."}), 400
 
-       user_data["answers"].append(score) #Store the index to the selected option
-       user_data["timestamp"] = datetime.datetime.utcnow()  # Update session timestamp
-
     except ValueError:
         return jsonify({"error": "Invalid response format. Answer should be the index of your choice (0-n)."}), 400
 
@@ -147,8 +126,15 @@ def next_question():
     category = user_data["category"]
     asked_question_ids = user_data["question_ids"]
 
-    # Fetch a random question from the database excluding already asked question
-    next_question_doc = question_collection.find_one({"category": category, "_id": {"$nin": asked_question_ids}}) #Excludes already asked question
+    # Fetch the next question excluding already asked questions
+    next_question_doc = catalog.next_question(category, asked_question_ids)
+
+    # Store the index to the selected option (and the next question) in one atomic update
+    user_data = store.record_answer(user_id, last_question_id, score,
+                                    next_question_doc["_id"] if next_question_doc else None)
+    if user_data is None:
+        return jsonify({"error": "Answer already recorded or session expired. Please continue or restart."}), 409
+
     if not next_question_doc:
         # No more questions
         score, level = calculate_score(user_data["answers"], user_data["question_ids"])
@@ -159,30 +145,54 @@ def next_question():
             "category": user_data["category"],
             "mental_score": score,
             "level": level,
-            "timestamp": datetime.datetime.utcnow().isoformat()
+            "timestamp": datetime.datetime.utcnow()
         }
+        try:
+            record_result(result)
+        except Exception as e:
+            print(f"Error storing assessment result: {e}")  # The user still gets their score
+        result["timestamp"] = result["timestamp"].isoformat()
 
         # Remove session after completion
-        del ongoing_assessments[user_id]
+        store.delete(user_id)
 
         return jsonify(result), 200
 
-    # Append the question ID and return the question
-    user_data["question_ids"].append(next_question_doc["_id"])
-    return jsonify({"question": next_question_doc["question_text"], "options": next_question_doc.get("options")}), 200
+    # Return the next question
+    return jsonify({"question": next_question_doc["question_text"], "options": next_question_doc.get("options"),
+                    "question_id": str(next_question_doc["_id"])}), 200
 
 @assessment_bp.route("/categories", methods=["GET"])
 def get_categories():
     """Get all available assessment categories."""
     try:
-        if question_collection is None:
-            return jsonify({"error": "Database connection error: question_collection is not initialized."}), 500
-            
-        valid_categories = question_collection.distinct("category")
+        valid_categories = list(get_question_catalog().categories)
         return jsonify({
             "categories": valid_categories,
             "count": len(valid_categories)
         }), 200
     except Exception as e:
         print(f"Error fetching distinct categories: {e}")
-        return jsonify({"error": "Error fetching categories from the database."}), 500
\ No newline at end of file
+        return jsonify({"error": "Error fetching categories from the database."}), 500
+
+@assessment_bp.route("/trends", methods=["GET"])
+def get_score_trends():
+    """Get the user's per-category score trends (daily averages) from precomputed rollups."""
+    user_id = verify_jwt_token(request)
+    if not user_id:
+        return jsonify({"error": "Unauthorized access"}), 401
+
+    category = request.args.get("category")
+    days = request.args.get("days")
+    try:
+        days = int(days) if days else None
+    except ValueError:
+        return jsonify({"error": "days must be an integer."}), 400
+
+    try:
+        trends = get_trends(user_id, category=category, days=days)
+    except Exception as e:
+        print(f"Error fetching assessment trends: {e}")
+        return jsonify({"error": "Error fetching assessment trends from the database."}), 500
+
+    return jsonify({"trends": trends}), 200
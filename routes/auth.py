@@ -1,13 +1,18 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
 import uuid
 from config import JWT_SECRET_KEY
-from utils import store_session  # Import store_session from utils
+from utils import store_session, get_auth_claims  # Import store_session from utils
+from passwords import hash_password, verify_password, HashingBusy
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/api/auth")
 
+@auth_bp.errorhandler(HashingBusy)
+def hashing_busy(e):
+    """Shed load quickly when the password-hashing pool is saturated."""
+    return jsonify({"error": "Server is busy, please try again shortly."}), 503, {"Retry-After": "1"}
+
 def generate_token(user_id, session_id):
     """
     Generate a JWT token containing the user_id and session_id.
@@ -29,24 +34,15 @@ def decode_token(token):
         return None
 
 def verify_jwt_token(req):
-    """Verify and decode JWT token from request headers; returns user_id if valid."""
-    auth_header = req.headers.get("Authorization")
-    if not auth_header:
-        return None  # No token provided
-    
-    # Ensure the header is in the expected format
-    parts = auth_header.split()
-    if len(parts) != 2 or parts[0].lower() != "bearer":
-        return None  # Improper header format
-    
-    token = parts[1]
-    try:
-        decoded_token = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
-        return decoded_token.get("user_id")
-    except jwt.ExpiredSignatureError:
-        return None  # Token expired
-    except jwt.InvalidTokenError:
-        return None  # Token invalid
+    """Verify and decode JWT token from request headers; returns user_id if valid.
+
+    The claims are decoded once per request (and cached across requests by
+    token digest), see utils.get_auth_claims.
+    """
+    claims = get_auth_claims(req)
+    if not claims:
+        return None  # No token, improper header format, expired or invalid
+    return claims.get("user_id")
 
 @auth_bp.route("/register", methods=["POST"])
 def register():
@@ -72,7 +68,7 @@ def register():
     if users_collection.find_one({"email": email}):
         return jsonify({"error": "User already exists"}), 409
 
-    hashed_password = generate_password_hash(password)
+    hashed_password = hash_password(password)
     users_collection.insert_one({"username": user_name, "email": email, "password": hashed_password})
 
     return jsonify({"message": "User registered successfully!"}), 201
@@ -102,9 +98,14 @@ def login():
     if not user:
         return jsonify({"error": "User not found. Please register first."}), 404
 
-    if not check_password_hash(user.get("password", ""), password):
+    valid, new_hash = verify_password(user.get("password", ""), password)
+    if not valid:
         return jsonify({"error": "Invalid credentials"}), 401
 
+    if new_hash:
+        # PASSWORD_HASH_METHOD changed since this hash was made; upgrade it transparently
+        users_collection.update_one({"_id": user["_id"], "password": user["password"]}, {"$set": {"password": new_hash}})
+
     # Generate a unique session_id
     session_id = f"session_{user['_id']}_{uuid.uuid4()}"
 
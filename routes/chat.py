@@ -1,67 +1,119 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import time
 import uuid
-from utils import create_chain, get_session_history, store_chat_history, get_session_id, get_user_sessions
+import json
+from utils import (get_chain, get_generation_chain, gather_chain_inputs, record_turn, get_session_history,
+                   store_chat_history, get_session_id, get_user_sessions, get_session_messages,
+                   get_first_messages)
 from routes.auth import verify_jwt_token
 from database.models import chat_history_collection
+from config import CHAT_PIPELINE_MODE, HISTORY_PAGE_SIZE, HISTORY_PAGE_MAX
 import logging
 from bson import ObjectId
 import re
 from collections import Counter
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-import nltk
+from nltk_resources import get_tokenizer, get_stop_words
 
 logger = logging.getLogger(__name__)
 
 chat_bp = Blueprint("chat", __name__, url_prefix="/api/chat")
 
-nltk.download("punkt")
-nltk.download("stopwords")
-
 def extract_keywords(text, max_keywords=5):
     """Extracts important keywords from the given text."""
-    stop_words = set(stopwords.words("english"))
-    words = word_tokenize(text.lower())  # Tokenize and convert to lowercase
+    stop_words = get_stop_words()
+    words = get_tokenizer()(text.lower())  # Tokenize and convert to lowercase
     words = [word for word in words if word.isalnum() and word not in stop_words]  # Remove punctuation & stopwords
     word_freq = Counter(words)  # Count word frequency
     keywords = [word for word, _ in word_freq.most_common(max_keywords)]  # Pick top keywords
     return " ".join(keywords).title()  # Convert to title case
 
+def save_ai_response(user_input: str, session_id: str, ai_response: str):
+    """Persist a completed turn and return (response_id, session_title).
+
+    The session title is set to the first 5 words of the input only while it
+    is still "New Session"; that happens in the same write as the turn.
+    """
+    response_id = str(uuid.uuid4())  # Generate unique response_id
+    title = " ".join(user_input.split()[:5]) + "..."  # Use first 5 words as title
+    session_title = store_chat_history(session_id, user_input, ai_response, response_id, title=title)
+    return response_id, session_title or "New Session"
+
 def generate_ai_response(user_input: str, session_id: str) -> dict:
     """Generate a response using LangChain and store chat history."""
-    chain = create_chain()
-
     start_time = time.time()
-    ai_response = chain.invoke(
-        {"input": user_input, "session_id": session_id},
-        config={"configurable": {"session_id": session_id}}
-    )
+    timings = None
+    if CHAT_PIPELINE_MODE == "concurrent":
+        inputs, history, timings = gather_chain_inputs(user_input, session_id)
+        llm_start = time.perf_counter()
+        ai_response = get_generation_chain().invoke(inputs)
+        timings["llm"] = round(time.perf_counter() - llm_start, 4)
+        record_turn(history, user_input, ai_response)
+        logger.info(f"Pipeline timings for {session_id}: {timings}")
+    else:
+        ai_response = get_chain().invoke(
+            {"input": user_input, "session_id": session_id},
+            config={"configurable": {"session_id": session_id}}
+        )
     end_time = time.time()
     response_time = round(end_time - start_time, 2)
 
-    response_id = str(uuid.uuid4())
+    response_id, session_title = save_ai_response(user_input, session_id, ai_response)
 
-    # Store only the message string
-    response_id = str(uuid.uuid4())  # Generate unique response_id
-    ai_message = {"role": "AI", "message": ai_response, "response_id": response_id, "created_at": time.time()}
-    store_chat_history(session_id, user_input, ai_message)
+    response_data = {
+        "response_id": response_id,
+        "message": ai_response,
+        "response_time": response_time,
+        "session_title": session_title
+    }
+    if timings is not None:
+        response_data["timings"] = timings
+    return response_data
 
+def sse_event(data: dict, event: str = None) -> str:
+    """Format a payload as a Server-Sent Event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
-    # Update session title only if it’s still "New Session"
-    session = chat_history_collection.find_one({"session_id": session_id})
-    if session and session.get("title") == "New Session":
-        title = " ".join(user_input.split()[:5]) + "..."  # Use first 5 words as title
-        chat_history_collection.update_one(
-            {"session_id": session_id},
-            {"$set": {"title": title}}
-        )
+def stream_ai_response(user_input: str, session_id: str):
+    """Yield the AI response as SSE token events, then persist it and emit a final 'done' event."""
+    start_time = time.time()
+    first_token_time = None
+    chunks = []
+    history = None
+    try:
+        if CHAT_PIPELINE_MODE == "concurrent":
+            inputs, history, timings = gather_chain_inputs(user_input, session_id)
+            logger.info(f"Pipeline timings for {session_id}: {timings}")
+            token_stream = get_generation_chain().stream(inputs)
+        else:
+            token_stream = get_chain().stream(
+                {"input": user_input, "session_id": session_id},
+                config={"configurable": {"session_id": session_id}}
+            )
+        for chunk in token_stream:
+            if not chunk:
+                continue
+            if first_token_time is None:
+                first_token_time = time.time()
+            chunks.append(chunk)
+            yield sse_event({"token": chunk})
+    except Exception as e:
+        logger.error(f"Error streaming AI response: {e}")
+        yield sse_event({"error": "Error generating response"}, event="error")
+        return
+
+    end_time = time.time()
+    ai_response = "".join(chunks)
+    if history is not None:
+        record_turn(history, user_input, ai_response)
+    response_id, session_title = save_ai_response(user_input, session_id, ai_response)
 
-    return {
+    yield sse_event({
         "response_id": response_id,
-        "message": ai_response,
-        "response_time": response_time
-    }
+        "response_time": round(end_time - start_time, 2),
+        "time_to_first_token": round((first_token_time or end_time) - start_time, 2),
+        "session_title": session_title
+    }, event="done")
 
 @chat_bp.route("/send", methods=["POST"])
 def chat():
@@ -76,19 +128,32 @@ def chat():
         return jsonify({"error": "Invalid session or token"}), 401
 
     response_data = generate_ai_response(user_input, session_id)
+    return jsonify(response_data), 200
 
-    # Fetch updated session title to return it in response
-    session = chat_history_collection.find_one({"session_id": session_id})
-    session_title = session.get("title", "New Session") if session else "New Session"
+@chat_bp.route("/stream", methods=["POST"])
+def chat_stream():
+    """Streams the AI response to the user's message as Server-Sent Events."""
+    data = request.get_json()
+    user_input = data.get("message", "")
+    if not user_input:
+        return jsonify({"error": "Message content required"}), 400
 
-    return jsonify({
-        **response_data,
-        "session_title": session_title
-    }), 200
+    session_id = get_session_id()
+    if not session_id:
+        return jsonify({"error": "Invalid session or token"}), 401
+
+    return Response(
+        stream_with_context(stream_ai_response(user_input, session_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @chat_bp.route("/history", methods=["GET"])
 def chat_history():
-    """Fetches the chat history of a specific session."""
+    """Fetches one page of a session's chat history, oldest first.
+
+    Pass the returned next_cursor as ?cursor= to fetch the page before it.
+    """
     user_id = verify_jwt_token(request)
     if not user_id:
         return jsonify({"error": "Unauthorized. Please log in."}), 401
@@ -98,12 +163,28 @@ def chat_history():
         return jsonify({"error": "Session ID required"}), 400
 
     try:
-        session = chat_history_collection.find_one({"session_id": session_id, "user_id": ObjectId(user_id)})
+        limit = min(int(request.args.get("limit", HISTORY_PAGE_SIZE)), HISTORY_PAGE_MAX)
+        cursor = request.args.get("cursor")
+        cursor = int(cursor) if cursor is not None else None
+    except ValueError:
+        return jsonify({"error": "cursor and limit must be integers"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+
+    try:
+        session = chat_history_collection.find_one(
+            {"session_id": session_id, "user_id": ObjectId(user_id)},
+            {"title": 1}
+        )
         if not session:
             return jsonify({"error": "Session not found or access denied"}), 403
 
-        history = session.get("messages", [])
-        return jsonify({"history": history, "title": session.get("title", "New Session")}), 200
+        history, next_cursor = get_session_messages(session_id, cursor, limit)
+        return jsonify({
+            "history": history,
+            "next_cursor": next_cursor,
+            "title": session.get("title", "New Session")
+        }), 200
     except Exception as e:
         logger.error(f"Error retrieving chat history: {e}")
         return jsonify({"error": "Internal server error"}), 500
@@ -120,16 +201,20 @@ def save_session():
         return jsonify({"error": "Invalid session"}), 400
 
     try:
-        session = chat_history_collection.find_one({"session_id": session_id, "user_id": ObjectId(user_id)})
+        session = chat_history_collection.find_one(
+            {"session_id": session_id, "user_id": ObjectId(user_id)},
+            {"title": 1}
+        )
         if not session:
             return jsonify({"error": "Session not found"}), 404
 
         current_title = session.get("title", "New Session")
-        messages = session.get("messages", [])
         title = current_title  # Default to current title
 
         # Only generate a new title if the current title is "New Session"
-        if current_title == "New Session" and messages:
+        if current_title == "New Session":
+            # The first turn (user message + AIRA response) is all the title needs
+            messages = get_first_messages(session_id)
             # Find the first response from AIRA
             for msg in messages:
                 if msg.get("sender") == "AIRA":
@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from database.models import get_database
+from database import feedback_rollups
 from routes.auth import verify_jwt_token  
 from utils import get_session_id
 import logging
@@ -13,56 +16,94 @@ def get_feedback_collections():
     db = get_database()
     return db["feedback_responses"], db["daily_feedback"]
 
-@feedback_bp.route("/submit", methods=["POST"])
-def submit_feedback():
-    """Submit structured feedback for chatbot responses."""
-    feedback_collection, _ = get_feedback_collections()
-
-    user_id = verify_jwt_token(request)
-    if not user_id:
-        return jsonify({"error": "Unauthorized. Please log in."}), 401
+MAX_BULK_FEEDBACK = 500
 
-    data = request.json
-    session_id = get_session_id()
+def validate_feedback(data):
+    """Validate one feedback payload; return (feedback document, None) or (None, error dict)."""
     response_id = data.get("response_id")
     feedback_type = data.get("feedback_type")
     comment = data.get("comment", "")
 
-    if not session_id or not response_id or feedback_type not in ["like", "dislike"]:
-        return jsonify({"error": "Invalid feedback data", 
-                        "details": "session_id, response_id, and feedback_type ('like' or 'dislike') are required."}), 400
+    if not response_id or feedback_type not in ["like", "dislike"]:
+        return None, {"error": "Invalid feedback data",
+                      "details": "session_id, response_id, and feedback_type ('like' or 'dislike') are required."}
 
-    if feedback_type == "dislike" and not comment.strip():
-        return jsonify({"error": "Comment required", 
-                        "details": "A comment is required when submitting a 'dislike' feedback."}), 400
+    if feedback_type == "dislike" and not str(comment).strip():
+        return None, {"error": "Comment required",
+                      "details": "A comment is required when submitting a 'dislike' feedback."}
 
-    new_feedback = {
+    return {
         "response_id": response_id,
         "feedback_type": feedback_type,
         "comment": comment,
         "timestamp": datetime.utcnow()
-    }
+    }, None
+
+def feedback_update(user_id, session_id, feedback):
+    """Return (filter, pipeline) that replaces or appends feedback for its response_id in one atomic upsert.
+
+    The aggregation-pipeline update rewrites the matching array element if the
+    response_id is already present, otherwise appends it, and upserts the
+    user_id + session_id document if it doesn't exist yet.
+    """
+    response_id = {"$literal": feedback["response_id"]}
+    new_feedback = {"$literal": feedback}
+    return (
+        {"user_id": user_id, "session_id": session_id},
+        [{"$set": {"feedbacks": {"$let": {
+            "vars": {"existing": {"$ifNull": ["$feedbacks", []]}},
+            "in": {"$cond": [
+                {"$in": [response_id, "$$existing.response_id"]},
+                {"$map": {"input": "$$existing", "as": "f", "in": {
+                    "$cond": [{"$eq": ["$$f.response_id", response_id]}, new_feedback, "$$f"]
+                }}},
+                {"$concatArrays": ["$$existing", [new_feedback]]}
+            ]}
+        }}}}]
+    )
+
+def upsert_feedback(feedback_collection, user_id, session_id, feedback):
+    """Apply feedback_update and return the rating it replaced (or None), in one round trip.
+
+    Two first ratings in a new session can race to upsert the same document;
+    the unique (user_id, session_id) index lets one win and the loser retries
+    as an update.
+    """
+    for attempt in range(2):
+        try:
+            before = feedback_collection.find_one_and_update(
+                *feedback_update(user_id, session_id, feedback),
+                projection={"feedbacks": {"$elemMatch": {"response_id": feedback["response_id"]}}},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+            return (before or {}).get("feedbacks", [None])[0]
+        except DuplicateKeyError:
+            if attempt:
+                raise
 
+@feedback_bp.route("/submit", methods=["POST"])
+def submit_feedback():
+    """Submit structured feedback for chatbot responses."""
+    feedback_collection, _ = get_feedback_collections()
+
+    user_id = verify_jwt_token(request)
+    if not user_id:
+        return jsonify({"error": "Unauthorized. Please log in."}), 401
+
+    data = request.json
+    session_id = get_session_id()
+    new_feedback, error = validate_feedback(data)
+    if not session_id and not error:
+        error = {"error": "Invalid feedback data",
+                 "details": "session_id, response_id, and feedback_type ('like' or 'dislike') are required."}
+    if error:
+        return jsonify(error), 400
+
+    response_id = new_feedback["response_id"]
     try:
-        # Check if feedback for this response_id already exists
-        existing_feedback = feedback_collection.find_one(
-            {"user_id": user_id, "session_id": session_id, "feedbacks.response_id": response_id},
-            {"feedbacks.$": 1}  # Projection to fetch only matching feedback
-        )
-
-        if existing_feedback:
-            # Update existing feedback entry
-            feedback_collection.update_one(
-                {"user_id": user_id, "session_id": session_id, "feedbacks.response_id": response_id},
-                {"$set": {"feedbacks.$": new_feedback}}
-            )
-        else:
-            # Append if no feedback exists for this response_id
-            feedback_collection.update_one(
-                {"user_id": user_id, "session_id": session_id},
-                {"$push": {"feedbacks": new_feedback}},
-                upsert=True  # Create a new document if user_id + session_id doesn't exist
-            )
+        # The replaced rating (if any), for the rollups
+        previous = upsert_feedback(feedback_collection, user_id, session_id, new_feedback)
 
         logger.info(f"Feedback updated by user {user_id} for session {session_id}, response {response_id}")
 
@@ -70,8 +111,76 @@ def submit_feedback():
         logger.error(f"Database error while submitting feedback: {e}")
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
+    try:
+        feedback_rollups.apply(feedback_rollups.response_feedback_ops(user_id, previous, new_feedback))
+    except Exception as e:
+        logger.error(f"Error updating feedback rollups: {e}")
+
     return jsonify({"message": "Feedback recorded successfully"}), 200
 
+@feedback_bp.route("/bulk", methods=["POST"])
+def submit_bulk_feedback():
+    """Submit many response ratings at once (e.g. replayed from an offline queue).
+
+    Body: {"feedbacks": [{"response_id", "feedback_type", "comment", "session_id"?}, ...]}.
+    session_id defaults to the token's session. Valid items are applied in
+    order, each with the same atomic upsert as /submit, so the rollups move
+    counts from the rating each write actually replaced even when other
+    requests rate the same responses concurrently. Invalid or failed items
+    are reported by index.
+    """
+    feedback_collection, _ = get_feedback_collections()
+
+    user_id = verify_jwt_token(request)
+    if not user_id:
+        return jsonify({"error": "Unauthorized. Please log in."}), 401
+
+    data = request.json or {}
+    items = data.get("feedbacks")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Invalid feedback data", "details": "'feedbacks' must be a non-empty list."}), 400
+    if len(items) > MAX_BULK_FEEDBACK:
+        return jsonify({"error": "Too many feedback items", "details": f"At most {MAX_BULK_FEEDBACK} per request."}), 413
+
+    default_session_id = get_session_id()
+    rollup_operations, errors = [], []
+    recorded = 0
+    database_error = None  # After one failure the remaining items are not attempted
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "error": "Invalid feedback data"})
+            continue
+        session_id = item.get("session_id") or default_session_id
+        feedback, error = validate_feedback(item)
+        if not session_id and not error:
+            error = {"error": "Invalid feedback data", "details": "session_id is required."}
+        if error:
+            errors.append({"index": index, **error})
+            continue
+        if database_error is None:
+            try:
+                previous = upsert_feedback(feedback_collection, user_id, session_id, feedback)
+            except Exception as e:
+                logger.error(f"Database error while submitting bulk feedback: {e}")
+                database_error = str(e)
+        if database_error is not None:
+            errors.append({"index": index, "error": "Database error", "details": database_error})
+            continue
+        recorded += 1
+        rollup_operations += feedback_rollups.response_feedback_ops(user_id, previous, feedback)
+
+    if recorded:
+        logger.info(f"Bulk feedback: {recorded} ratings recorded for user {user_id}")
+        try:
+            feedback_rollups.apply(rollup_operations)
+        except Exception as e:
+            logger.error(f"Error updating feedback rollups: {e}")
+    elif database_error is not None:
+        return jsonify({"error": "Database error", "details": database_error}), 500
+
+    status = 200 if not errors else 207
+    return jsonify({"message": "Feedback recorded", "recorded": recorded, "errors": errors}), status
+
 
 @feedback_bp.route("/daily_feedback", methods=["POST"])
 def submit_daily_feedback():
@@ -94,16 +203,22 @@ def submit_daily_feedback():
         return jsonify({"error": "Invalid rating", "details": "Rating must be a number between 1 and 5."}), 400
 
     try:
+        timestamp = datetime.utcnow()
         daily_feedback_collection.insert_one({
             "user_id": user_id,
             "session_id": session_id,
             "rating": rating,
             "comment": comment,
-            "timestamp": datetime.utcnow()
+            "timestamp": timestamp
         })
         logger.info(f"Daily feedback submitted by user {user_id} for session {session_id}")
     except Exception as e:
         logger.error(f"Database error while submitting daily feedback: {e}")
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
+    try:
+        feedback_rollups.apply(feedback_rollups.daily_rating_ops(user_id, rating, timestamp))
+    except Exception as e:
+        logger.error(f"Error updating feedback rollups: {e}")
+
     return jsonify({"message": "Daily experience feedback submitted successfully"}), 200
\ No newline at end of file
@@ -1,15 +1,20 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify
 from database.models import get_database
 from bson import ObjectId
-from werkzeug.security import generate_password_hash
-from routes.auth import verify_jwt_token
+from bson.errors import InvalidId
+from routes.auth import verify_jwt_token, hashing_busy
+from passwords import hash_password, HashingBusy
 from dotenv import load_dotenv
 import os
 import logging
 import uuid
 from werkzeug.utils import secure_filename
-from io import BytesIO
+from werkzeug.wsgi import FileWrapper
 import gridfs
+from gridfs.errors import NoFile
+from config import PHOTO_CACHE_MAX_AGE
+from photos import (store_photo, find_rendition, collect_superseded, InvalidImage, RENDITIONS,
+                    get_cached_photo, cache_photo)
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -24,6 +29,11 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def current_photo(users_collection, user_id):
+    """The photo id the user has now, read before it is replaced so it can be collected."""
+    user = users_collection.find_one({"_id": ObjectId(user_id)}, {"profile_photo": 1})
+    return user.get("profile_photo") if user else None
+
 @user_bp.route("/profile", methods=["GET"])
 def get_profile():
     """Retrieve user profile safely."""
@@ -87,36 +97,29 @@ def update_profile():
         
         # Handle password update
         if new_password:
-            update_data["password"] = generate_password_hash(new_password)
+            update_data["password"] = hash_password(new_password)
         
         # Handle file upload for profile photo
+        previous_photo = None
         if 'profile_photo' in request.files:
             file = request.files['profile_photo']
             if file and file.filename and allowed_file(file.filename):
-                # Initialize GridFS
-                fs = gridfs.GridFS(db)
-                
-                # Get file content and metadata
                 filename = secure_filename(file.filename)
-                content_type = file.content_type
-                
-                # Store the file in GridFS
-                file_id = fs.put(
-                    file.read(),
-                    filename=filename,
-                    content_type=content_type,
-                    user_id=user_id
-                )
-                
-                # Store the file_id in the user document
-                update_data["profile_photo"] = str(file_id)
-                update_data["profile_photo_type"] = content_type
+                update_data["profile_photo"] = store_photo(db, user_id, file.read(), filename)
+                update_data["profile_photo_type"] = "image/jpeg"
+                previous_photo = current_photo(users_collection, user_id)
                 logger.info(f"Uploaded profile photo for user {user_id}: {filename}")
 
         result = users_collection.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": update_data}
         )
+        if previous_photo != update_data.get("profile_photo", previous_photo):
+            collect_superseded(db, previous_photo)
+    except HashingBusy as e:
+        return hashing_busy(e)
+    except InvalidImage:
+        return jsonify({"error": "Uploaded file is not a valid image"}), 400
     except Exception as e:
         logger.error(f"Database error while updating profile: {e}")
         return jsonify({"error": "Database error", "details": str(e)}), 500
@@ -144,42 +147,34 @@ def upload_profile_photo():
     if file and allowed_file(file.filename):
         try:
             db = get_database()
-            # Initialize GridFS
-            fs = gridfs.GridFS(db)
-            
-            # Get file content and metadata
-            filename = secure_filename(file.filename)
-            content_type = file.content_type
-            
-            # Store the file in GridFS
-            file_id = fs.put(
-                file.read(),
-                filename=filename,
-                content_type=content_type,
-                user_id=user_id
-            )
-            
-            # Update the user's profile photo in the database
             users_collection = db["users"]
-            
-            # Store file_id reference and content type
+
+            # Store the resized renditions (or reuse an identical earlier upload)
+            photo_id = store_photo(db, user_id, file.read(), secure_filename(file.filename))
+            previous_photo = current_photo(users_collection, user_id)
+
+            # Store the photo id reference and content type
             result = users_collection.update_one(
                 {"_id": ObjectId(user_id)},
                 {"$set": {
-                    "profile_photo": str(file_id),
-                    "profile_photo_type": content_type
+                    "profile_photo": photo_id,
+                    "profile_photo_type": "image/jpeg"
                 }}
             )
             
-            if result.modified_count == 0:
+            if result.matched_count == 0:
                 return jsonify({"error": "Failed to update profile photo or user not found"}), 400
+            if previous_photo != photo_id:
+                collect_superseded(db, previous_photo)
                 
             logger.info(f"Profile photo uploaded for user {user_id}")
             return jsonify({
                 "message": "Profile photo uploaded successfully",
-                "profile_photo": str(file_id)
+                "profile_photo": photo_id
             }), 200
             
+        except InvalidImage:
+            return jsonify({"error": "Uploaded file is not a valid image"}), 400
         except Exception as e:
             logger.error(f"Error uploading profile photo: {e}")
             return jsonify({"error": "Error uploading file", "details": str(e)}), 500
@@ -188,29 +183,51 @@ def upload_profile_photo():
 
 @user_bp.route("/photo/<file_id>")
 def get_profile_photo(file_id):
-    """Retrieve a profile photo from GridFS by its ID."""
-    try:
-        db = get_database()
-        fs = gridfs.GridFS(db)
-        
-        # Check if file exists
-        if not fs.exists(ObjectId(file_id)):
+    """Stream a profile photo from GridFS by its ID.
+
+    A GridFS file never changes once written, so the file id is a strong
+    ETag and responses may be cached for PHOTO_CACHE_MAX_AGE. A matching
+    If-None-Match is answered with 304 before touching the database, small
+    files are served from the in-process photo cache, and Range requests on
+    larger ones seek within the file instead of reading all of it.
+    ``?size=`` selects one of the renditions in photos.RENDITIONS.
+    """
+    size = request.args.get("size")
+    if size and size not in RENDITIONS:
+        return jsonify({"error": f"Unknown size. Choose from: {', '.join(RENDITIONS)}"}), 400
+    etag = f"{file_id}-{size}" if size else file_id
+    if request.if_none_match.contains(etag):
+        return photo_response(Response(status=304), etag)
+
+    photo = get_cached_photo(etag)  # Popular avatars are served without a Mongo round trip
+    if photo is None:
+        try:
+            grid_out = find_rendition(gridfs.GridFS(get_database()), ObjectId(file_id), size)  # One round trip
+            photo = cache_photo(etag, grid_out)
+        except (InvalidId, NoFile):
             return jsonify({"error": "File not found"}), 404
-            
-        # Get the file from GridFS
-        file_data = fs.get(ObjectId(file_id))
-        
-        # Create a BytesIO object from the file data
-        file_stream = BytesIO(file_data.read())
-        
-        # Return the file with the correct content type
-        return send_file(
-            file_stream,
-            mimetype=file_data.content_type,
-            as_attachment=False,
-            download_name=file_data.filename
-        )
-    
-    except Exception as e:
-        logger.error(f"Error retrieving profile photo: {e}")
-        return jsonify({"error": "Error retrieving file", "details": str(e)}), 500
\ No newline at end of file
+        except Exception as e:
+            logger.error(f"Error retrieving profile photo: {e}")
+            return jsonify({"error": "Error retrieving file", "details": str(e)}), 500
+
+    if photo is not None:
+        body, length, meta = photo.data, len(photo.data), photo
+    else:
+        # Chunks are read lazily from GridFS while the body is sent
+        body, length, meta = FileWrapper(grid_out, buffer_size=grid_out.chunk_size), grid_out.length, grid_out
+
+    response = Response(body, mimetype=meta.content_type or "application/octet-stream", direct_passthrough=True)
+    response.content_length = length
+    response.last_modified = meta.upload_date
+    if meta.filename:
+        response.headers.set("Content-Disposition", "inline", filename=meta.filename)
+    photo_response(response, etag)
+    return response.make_conditional(request, accept_ranges=True, complete_length=length)
+
+def photo_response(response, etag):
+    """Add the validators and long-lived caching headers every photo response carries."""
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = PHOTO_CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
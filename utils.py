@@ -1,20 +1,36 @@
 import time
 import gc
+import json
 import logging
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+import os
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.runnables import RunnableMap
-from config import GROQ_API_KEY, JWT_SECRET_KEY
-from flask import request
+from langchain_core.messages import SystemMessage
+from dotenv import load_dotenv
+from config import (JWT_SECRET_KEY, PIPELINE_MAX_WORKERS, SUMMARY_MAX_WORKERS, EMBEDDING_CACHE_SIZE,
+                    EMBEDDING_BATCH_WAIT_MS, EMBEDDING_BATCH_MAX_SIZE, FAISS_RELOAD_INTERVAL,
+                    SESSION_CACHE_MAX_ENTRIES, SESSION_CACHE_MAX_BYTES, SESSION_CACHE_TTL,
+                    HISTORY_MAX_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_SUMMARY_BATCH, HISTORY_PAGE_SIZE,
+                    CHAT_WRITE_BEHIND, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_INTERVAL,
+                    WRITE_BEHIND_MAX_QUEUE, WRITE_BEHIND_MAX_RETRIES, WRITE_BEHIND_DEAD_LETTER_PATH,
+                    TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+from caching import LRUCache
+from write_behind import WriteBehindQueue
+from embeddings import CachedEmbeddings, MicroBatchingEmbeddings
+from flask import request, g, has_request_context
 import jwt
+import hashlib
 import datetime
-from database.models import chat_history_collection
+from database.models import chat_history_collection, chat_messages_collection, split_message
+from pymongo import ReturnDocument, InsertOne
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
 
 logger = logging.getLogger(__name__)
@@ -23,7 +39,17 @@ logger = logging.getLogger(__name__)
 model = None
 embedding_model = None
 retriever = None
-session_cache = {}
+retriever_snapshot = None
+retriever_checked_at = 0.0
+retriever_lock = threading.Lock()
+chain = None
+generation_chain = None
+chain_lock = threading.Lock()
+pipeline_executor = None
+summary_executor = None
+summary_chain = None
+summarizing = set()
+summarizing_lock = threading.Lock()
 
 # System prompt for AIRA
 system_prompt = """🌿 You are **AIRA**, an AI therapist dedicated to supporting individuals in their emotional well-being and mental health. Your role is to provide a **safe, supportive, and judgment-free space** for users to express their concerns. 🤗💙  
@@ -56,77 +82,301 @@ prompt = ChatPromptTemplate.from_messages([
 
 output_parser = StrOutputParser()
 
+summary_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You maintain a concise running summary of a therapy conversation between a user and AIRA, "
+               "an AI therapist. Keep the user's concerns, feelings, important personal details and any advice "
+               "already given. Write in the third person and stay under 200 words."),
+    ("human", "Current summary:\n{summary}\n\nNew messages:\n{messages}\n\nUpdated summary:")
+])
+
+class SessionHistory(ChatMessageHistory):
+    """Chat history plus the running summary of messages folded out of the prompt window."""
+    summary: str = ""
+    summarized_count: int = 0  # Number of leading messages (by seq) covered by summary
+    seqs: list = []  # seq of each message in messages; None until its turn's seq is reserved
+    title: str = None
+
+def llm_settings() -> dict:
+    """Read the Groq settings as they are now, re-reading .env, so a rebuilt model picks up changes."""
+    load_dotenv(override=True)
+    return {"groq_api_key": os.getenv("GROQ_API_KEY"), "model_name": os.getenv("GROQ_MODEL_NAME", "Llama3-8b-8192")}
+
 def get_model():
     """Lazy load the Groq LLM model."""
     global model
     if model is None:
         logger.info("Initializing Groq LLM model")
-        model = ChatGroq(groq_api_key=GROQ_API_KEY, model_name="Llama3-8b-8192")
+        from langchain_groq import ChatGroq  # Deferred so workers boot without importing the Groq client
+        model = ChatGroq(**llm_settings())
     return model
 
 def get_embedding_model():
-    """Lazy load the HuggingFace embedding model."""
+    """Lazy load the HuggingFace embedding model behind the micro-batcher and LRU query cache."""
     global embedding_model
     if embedding_model is None:
-        logger.info("Initializing embedding model")
-        embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        with chain_lock:
+            if embedding_model is None:
+                logger.info("Initializing embedding model")
+                from langchain_huggingface import HuggingFaceEmbeddings  # Deferred: pulls in torch
+                embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+                if EMBEDDING_BATCH_MAX_SIZE > 1:
+                    embeddings = MicroBatchingEmbeddings(embeddings, max_wait_ms=EMBEDDING_BATCH_WAIT_MS,
+                                                         max_batch_size=EMBEDDING_BATCH_MAX_SIZE)
+                if EMBEDDING_CACHE_SIZE > 0:
+                    embeddings = CachedEmbeddings(embeddings, maxsize=EMBEDDING_CACHE_SIZE)
+                embedding_model = embeddings
     return embedding_model
 
+def get_cache_stats() -> dict:
+    """Return runtime statistics for the in-process caches."""
+    stats = {}
+    layer = embedding_model
+    while layer is not None:
+        if isinstance(layer, CachedEmbeddings):
+            stats["embeddings"] = layer.stats()
+        elif isinstance(layer, MicroBatchingEmbeddings):
+            stats["embedding_batches"] = layer.stats()
+        layer = getattr(layer, "embeddings", None)
+    stats["sessions"] = session_cache.stats()
+    if token_cache is not None:
+        stats["tokens"] = token_cache.stats()
+    if chat_write_queue is not None:
+        stats["chat_write_behind"] = chat_write_queue.stats()
+    return stats
+
 def get_retriever():
-    """Lazy load the FAISS retriever."""
-    global retriever
+    """Lazy load the FAISS retriever, reloading it when ingestion publishes a new snapshot."""
+    global retriever, retriever_snapshot, retriever_checked_at
+    from faiss_index import get_index_path, current_snapshot  # Deferred: imports faiss and numpy
+    now = time.time()
+    if retriever is not None and FAISS_RELOAD_INTERVAL > 0 and now - retriever_checked_at > FAISS_RELOAD_INTERVAL:
+        retriever_checked_at = now
+        if current_snapshot(get_index_path()) != retriever_snapshot:
+            with retriever_lock:
+                # Another thread may have reloaded it while this one waited for the lock
+                if current_snapshot(get_index_path()) != retriever_snapshot:
+                    logger.info("New FAISS snapshot published, reloading retriever")
+                    load_retriever()
     if retriever is None:
-        logger.info("Initializing FAISS retriever")
-        embeddings = get_embedding_model()
-        vector_store = FAISS.load_local(
-            "faiss_therapist_replies",
-            embeddings=embeddings,
-            allow_dangerous_deserialization=True
-        )
-        retriever = vector_store.as_retriever(search_type="similarity", search_kwargs={"k": 2})
+        with retriever_lock:
+            if retriever is None:
+                load_retriever()
     return retriever
 
+def load_retriever():
+    """Load the active snapshot and swap it in; in-flight requests keep the previous retriever."""
+    global retriever, retriever_snapshot, retriever_checked_at
+    from faiss_index import get_index_path, load_vector_store, current_snapshot
+    snapshot = current_snapshot(get_index_path())
+    logger.info(f"Initializing FAISS retriever from {snapshot}")
+    embeddings = get_embedding_model()
+    vector_store = load_vector_store(snapshot, embeddings)
+    retriever = vector_store.as_retriever(search_type="similarity", search_kwargs={"k": 2})
+    retriever_snapshot = snapshot
+    retriever_checked_at = time.time()
+
 def format_retrieved(docs):
     """Format retrieved documents into a single string."""
     return " ".join([doc.page_content.replace("\n", " ") for doc in docs if hasattr(doc, "page_content")])
 
+def history_size(history: BaseChatMessageHistory) -> int:
+    """Approximate the memory held by a chat history in bytes."""
+    return sum(len(str(msg.content)) + 200 for msg in history.messages) + len(getattr(history, "summary", "")) + 200
+
+session_cache = LRUCache(
+    max_entries=SESSION_CACHE_MAX_ENTRIES,
+    max_bytes=SESSION_CACHE_MAX_BYTES,
+    ttl=SESSION_CACHE_TTL,
+    sizeof=history_size
+)
+
+def legacy_messages(session: dict) -> list:
+    """Messages still embedded in a chat_history document, as chat_messages-shaped dicts.
+
+    Sessions written before chat_messages existed keep their messages in the
+    "messages" array until database.migrations chat_messages moves them; the
+    array index is their seq.
+    """
+    return [{"seq": seq, **split_message(msg)} for seq, msg in enumerate(session.get("messages") or [])]
+
 def get_session_history(session_id: str) -> BaseChatMessageHistory:
     """Get chat history for a session, with caching."""
-    if session_id in session_cache:
-        cache_time, history = session_cache[session_id]
-        if time.time() - cache_time < 300:  # 5-minute cache
-            return history
+    history = session_cache.get(session_id)
+    if history is not None:
+        return history
 
-    history = ChatMessageHistory()
+    history = SessionHistory()
+    # Turns still queued for write-behind are not in Mongo yet. Snapshot them
+    # before reading so a flush in between can't hide a turn from both.
+    pending = chat_write_queue.pending(lambda t: t["session_id"] == session_id) if chat_write_queue else []
+    loaded_responses = set()
     try:
-        session = chat_history_collection.find_one({"session_id": session_id})
+        session = chat_history_collection.find_one(
+            {"session_id": session_id},
+            {"summary": 1, "summarized_count": 1, "title": 1, "messages": 1}
+        )
         if session:
-            for msg in session.get("messages", []):
+            history.title = session.get("title")
+            history.summary = session.get("summary", "")
+            history.summarized_count = session.get("summarized_count", 0)
+            # Only messages not yet folded into the summary are needed for the prompt
+            legacy = legacy_messages(session)
+            messages = chat_messages_collection.find(
+                {"session_id": session_id, "seq": {"$gte": max(history.summarized_count, len(legacy))}},
+                {"seq": 1, "role": 1, "message": 1, "response_id": 1}
+            ).sort("seq", 1)
+            for msg in itertools.chain(legacy[history.summarized_count:], messages):
                 if msg["role"] == "user":
                     history.add_user_message(msg["message"])
                 elif msg["role"] == "AI":
                     history.add_ai_message(msg["message"])
+                    loaded_responses.add(msg.get("response_id"))
+                else:
+                    continue
+                history.seqs.append(msg["seq"])
     except Exception as e:
         logger.error(f"Error fetching chat history: {e}")
 
-    session_cache[session_id] = (time.time(), history)
-    clean_session_cache()
+    for turn in pending:
+        if turn.get("response_id") not in loaded_responses:
+            history.add_user_message(turn["user_input"])
+            history.add_ai_message(turn["ai_response"])
+            seq = turn.get("seq")  # Set once the write-behind flusher has reserved it
+            history.seqs.extend([seq, seq + 1] if seq is not None else [None, None])
+        if turn.get("title") and history.title == "New Session":
+            history.title = turn["title"]
+
+    session_cache.put(session_id, history)
     return history
 
-def clean_session_cache():
-    """Remove old sessions from cache."""
-    current_time = time.time()
-    expired_sessions = [sid for sid, (timestamp, _) in session_cache.items() if current_time - timestamp > 600]  # 10 minutes
-    for sid in expired_sessions:
-        del session_cache[sid]
+def retrieve_context(x):
+    """Retrieve and format therapist replies relevant to the user input."""
+    return format_retrieved(get_retriever().invoke(x["input"]))
+
+def passthrough_input(x):
+    """Pass the user input through unchanged."""
+    return x["input"]
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for Llama 3)."""
+    return len(str(text)) // 4 + 1
+
+def history_window_start(history: BaseChatMessageHistory) -> int:
+    """Index of the oldest message that fits the last HISTORY_MAX_TURNS turns and the token budget."""
+    messages = history.messages
+    budget = HISTORY_TOKEN_BUDGET - estimate_tokens(getattr(history, "summary", ""))
+    start = len(messages)
+    oldest = max(0, len(messages) - 2 * HISTORY_MAX_TURNS)
+    while start > oldest:
+        cost = estimate_tokens(messages[start - 1].content)
+        if cost > budget:
+            break
+        budget -= cost
+        start -= 1
+    return start
+
+def history_window(history: BaseChatMessageHistory) -> list:
+    """Return the prompt messages for a session: the running summary followed by the recent window."""
+    window = history.messages[history_window_start(history):]
+    summary = getattr(history, "summary", "")
+    if summary:
+        return [SystemMessage(content=f"Summary of the earlier conversation: {summary}")] + window
+    return window
+
+def history_contents(x):
+    """Return the token-budgeted history window for the session."""
+    return history_window(get_session_history(x["session_id"]))
+
+def get_summary_chain():
+    """Return the shared chain that folds messages into a running summary."""
+    global summary_chain
+    if summary_chain is None:
+        with chain_lock:
+            if summary_chain is None:
+                summary_chain = summary_prompt | get_model() | output_parser
+    return summary_chain
+
+def foldable_messages(history: SessionHistory) -> tuple:
+    """Return (first, last) indices of the messages that can be folded into the summary now.
+
+    The run starts at the message whose seq is summarized_count, ends before
+    the prompt window, and stops at the first message whose seq is unknown or
+    not contiguous (a turn this worker never saw, or one whose seq is not
+    reserved yet), so the persisted count is always a real seq boundary.
+    """
+    end = history_window_start(history)
+    seqs = history.seqs
+    first = next((i for i in range(min(end, len(seqs))) if seqs[i] == history.summarized_count), None)
+    if first is None:
+        return 0, 0
+    last = first + 1
+    while last < min(end, len(seqs)) and seqs[last] is not None and seqs[last] == seqs[last - 1] + 1:
+        last += 1
+    return first, last
+
+def summarize_session(session_id: str, history: SessionHistory):
+    """Fold messages that left the prompt window into the stored summary, incrementally."""
+    try:
+        first, last = foldable_messages(history)
+        if last <= first:
+            return
+        folded = history.messages[first:last]
+        summarized_count = history.seqs[last - 1] + 1
+        transcript = "\n".join(f"{msg.type}: {msg.content}" for msg in folded)
+        summary = get_summary_chain().invoke({"summary": history.summary or "(none yet)", "messages": transcript})
+        # Only advance from the count this summary was built on; another worker may have moved it
+        previous = history.summarized_count if history.summarized_count else {"$in": [0, None]}
+        result = chat_history_collection.update_one(
+            {"session_id": session_id, "summarized_count": previous},
+            {"$set": {"summary": summary, "summarized_count": summarized_count}}
+        )
+        if result.matched_count == 0:
+            session_cache.pop(session_id)  # Stale; reload the newer summary on next use
+            return
+        history.summary = summary
+        history.summarized_count = summarized_count
+        logger.info(f"Summarized {len(folded)} messages for session {session_id}")
+    except Exception as e:
+        logger.error(f"Error summarizing session {session_id}: {e}")
+    finally:
+        with summarizing_lock:
+            summarizing.discard(session_id)
+
+def get_summary_executor():
+    """Lazy create the small thread pool for background summaries, kept apart from the request pipeline."""
+    global summary_executor
+    if summary_executor is None:
+        with chain_lock:
+            if summary_executor is None:
+                summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_MAX_WORKERS, thread_name_prefix="summary")
+    return summary_executor
+
+def schedule_summary(session_id: str):
+    """Summarize in the background once enough messages have left the prompt window.
+
+    Until the summary catches up, those messages are simply left out of the
+    prompt, so no LLM call is added to the request path, and summaries run on
+    their own executor so slow ones cannot occupy the pipeline's threads.
+    """
+    history = session_cache.peek(session_id)
+    if not isinstance(history, SessionHistory):
+        return
+    first, last = foldable_messages(history)
+    if last - first < HISTORY_SUMMARY_BATCH:
+        return
+    with summarizing_lock:
+        if session_id in summarizing:
+            return
+        summarizing.add(session_id)
+    get_summary_executor().submit(summarize_session, session_id, history)
 
 def create_chain():
-    """Create the LangChain chain on demand."""
+    """Build a new LangChain chain. Prefer get_chain() on the request path."""
     return RunnableWithMessageHistory(
         RunnableMap({
-            "context": lambda x: format_retrieved(get_retriever().invoke(x["input"])),
-            "input": lambda x: x["input"],
-            "chat_history": lambda x: [msg.content for msg in get_session_history(x["session_id"]).messages],
+            "context": retrieve_context,
+            "input": passthrough_input,
+            "chat_history": history_contents,
         })
         | prompt
         | get_model()
@@ -136,41 +386,329 @@ def create_chain():
         history_messages_key="chat_history"
     )
 
-def store_chat_history(session_id: str, user_input: str, ai_response: str):
-    """Store chat history in MongoDB."""
+def get_chain():
+    """Return the process-wide chain, building it once on first use.
+
+    The chain holds no per-request state (history is looked up by session_id
+    on each call), so a single instance is safe to share across threads.
+    """
+    global chain
+    if chain is None:
+        with chain_lock:
+            if chain is None:
+                logger.info("Building RAG chain")
+                chain = create_chain()
+    return chain
+
+def reset_chain():
+    """Drop the cached chains and LLM so the next call rebuilds them from current settings.
+
+    Called by POST /api/admin/chain/reset; it only affects the worker
+    process that serves the call.
+    """
+    global chain, generation_chain, summary_chain, model
+    with chain_lock:
+        chain = None
+        generation_chain = None
+        summary_chain = None
+        model = None
+
+def get_generation_chain():
+    """Return the shared prompt | model | parser chain used by the concurrent pipeline."""
+    global generation_chain
+    if generation_chain is None:
+        with chain_lock:
+            if generation_chain is None:
+                generation_chain = prompt | get_model() | output_parser
+    return generation_chain
+
+def get_pipeline_executor():
+    """Lazy create the bounded thread pool used by the concurrent pipeline."""
+    global pipeline_executor
+    if pipeline_executor is None:
+        with chain_lock:
+            if pipeline_executor is None:
+                pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix="pipeline")
+    return pipeline_executor
+
+def timed_embed_and_retrieve(user_input: str, timings: dict) -> str:
+    """Embed the query and search FAISS, recording each stage's duration."""
+    start = time.perf_counter()
+    embedding = get_embedding_model().embed_query(user_input)
+    embedded = time.perf_counter()
+    timings["embedding"] = round(embedded - start, 4)
+
+    retriever = get_retriever()
+    docs = retriever.vectorstore.similarity_search_by_vector(embedding, **retriever.search_kwargs)
+    timings["retrieval"] = round(time.perf_counter() - embedded, 4)
+    return format_retrieved(docs)
+
+def timed_session_history(session_id: str, timings: dict) -> BaseChatMessageHistory:
+    """Load the session history, recording the stage duration."""
+    start = time.perf_counter()
+    history = get_session_history(session_id)
+    timings["history"] = round(time.perf_counter() - start, 4)
+    return history
+
+def gather_chain_inputs(user_input: str, session_id: str):
+    """Run embedding + retrieval and the history fetch concurrently.
+
+    Returns (inputs, history, timings) where inputs feeds get_generation_chain()
+    and timings holds per-stage durations in seconds plus the wall-clock
+    "prepare" time, which should track the slowest stage.
+    """
+    timings = {}
+    start = time.perf_counter()
+    executor = get_pipeline_executor()
+    context_future = executor.submit(timed_embed_and_retrieve, user_input, timings)
+    history_future = executor.submit(timed_session_history, session_id, timings)
+    context = context_future.result()
+    history = history_future.result()
+    timings["prepare"] = round(time.perf_counter() - start, 4)
+
+    inputs = {
+        "context": context,
+        "input": user_input,
+        "chat_history": history_window(history),
+    }
+    return inputs, history, timings
+
+def record_turn(history: BaseChatMessageHistory, user_input: str, ai_response: str):
+    """Append a completed turn to the in-memory history, as RunnableWithMessageHistory does."""
+    history.add_user_message(user_input)
+    history.add_ai_message(ai_response)
+
+def title_update(title: str) -> dict:
+    """Pipeline expression that sets title only while the session is still "New Session"."""
+    return {"$cond": [{"$eq": ["$title", "New Session"]}, {"$literal": title}, "$title"]}
+
+def reserve_turns(session_id: str, turns: int, title: str = None) -> dict:
+    """Reserve seq numbers for `turns` turns (and set the title if still "New Session") in one find-and-modify.
+
+    Returns the updated session with message_count and title.
+    """
+    # Unmigrated sessions have no message_count yet; number new turns after their embedded messages
+    count = {"$ifNull": ["$message_count", {"$size": {"$ifNull": ["$messages", []]}}]}
+    update = {"message_count": {"$add": [count, 2 * turns]}}
+    if title:
+        update["title"] = title_update(title)
+    return chat_history_collection.find_one_and_update(
+        {"session_id": session_id},
+        [{"$set": update}],
+        projection={"message_count": 1, "title": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+def assign_turn_seqs(session_id: str, seq: int, user_input: str, ai_response: str):
+    """Record the seqs reserved for a turn on the cached history, matching its messages by content."""
+    history = session_cache.peek(session_id)
+    if not isinstance(history, SessionHistory):
+        return
+    messages, seqs = history.messages, history.seqs
+    seqs.extend([None] * (len(messages) - len(seqs)))
+    for i in range(len(messages) - 1, 0, -1):
+        if (seqs[i] is None and seqs[i - 1] is None and messages[i].content == ai_response
+                and messages[i - 1].content == user_input):
+            seqs[i - 1], seqs[i] = seq, seq + 1
+            return
+
+def turn_documents(session_id: str, seq: int, turn: dict) -> list:
+    """Build the user and AI message documents for a turn starting at seq."""
+    return [
+        {"session_id": session_id, "seq": seq, "role": "user", "message": turn["user_input"],
+         "created_at": turn["created_at"]},
+        {"session_id": session_id, "seq": seq + 1, "role": "AI", "message": turn["ai_response"],
+         "response_id": turn.get("response_id"), "created_at": turn["created_at"]}
+    ]
+
+DUPLICATE_KEY = 11000  # MongoDB error code for a unique index violation
+
+def apply_chat_turns(turns: list):
+    """Write a batch of queued turns: one find-and-modify per session, one bulk_write for all messages.
+
+    Seq numbers are reserved once per turn and kept on the queued turn, so
+    when WriteBehindQueue retries a failed batch no seqs are reserved again,
+    and messages that already landed hit the unique (session_id, seq) index
+    and are skipped.
+    """
+    by_session = {}
+    for turn in turns:
+        by_session.setdefault(turn["session_id"], []).append(turn)
+
+    operations = []
+    for session_id, session_turns in by_session.items():
+        unreserved = [turn for turn in session_turns if turn.get("seq") is None]
+        if unreserved:
+            title = next((turn["title"] for turn in unreserved if turn.get("title")), None)
+            session = reserve_turns(session_id, len(unreserved), title)
+            seq = session["message_count"] - 2 * len(unreserved)
+            for turn in unreserved:
+                turn["seq"] = seq
+                assign_turn_seqs(session_id, seq, turn["user_input"], turn["ai_response"])
+                seq += 2
+        for turn in session_turns:
+            operations.extend(InsertOne(doc) for doc in turn_documents(session_id, turn["seq"], turn))
     try:
-        chat_history_collection.update_one(
-            {"session_id": session_id},
-            {"$push": {"messages": {"$each": [
-                {"role": "user", "message": user_input},
-                {"role": "AI", "message": ai_response}
-            ]}}},
-            upsert=True
-        )
-        if session_id in session_cache:
-            _, history = session_cache[session_id]
-            history.add_user_message(user_input)
-            history.add_ai_message(ai_response)
-            session_cache[session_id] = (time.time(), history)
+        chat_messages_collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+            raise
+        if e.details.get("writeConcernErrors"):
+            raise
+        logger.info(f"Skipped {len(e.details['writeErrors'])} chat messages already written by an earlier attempt")
+
+def dead_letter_chat_turns(turns: list):
+    """Append turns that could not be written to a JSON-lines file, to be replayed by hand."""
+    with open(WRITE_BEHIND_DEAD_LETTER_PATH, "a") as f:
+        for turn in turns:
+            f.write(json.dumps(turn, default=str) + "\n")
+    logger.error(f"Dead-lettered {len(turns)} chat turns to {WRITE_BEHIND_DEAD_LETTER_PATH}")
+
+chat_write_queue = WriteBehindQueue(
+    apply_chat_turns,
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    interval=WRITE_BEHIND_INTERVAL,
+    name="chat-write-behind",
+    max_size=WRITE_BEHIND_MAX_QUEUE,
+    max_retries=WRITE_BEHIND_MAX_RETRIES,
+    dead_letter=dead_letter_chat_turns
+) if CHAT_WRITE_BEHIND else None
+
+def refresh_cached_history(session_id: str):
+    """Re-put the cached history after a turn to restart its TTL, update its size and maybe summarize.
+
+    The chain (or record_turn) has already appended the turn to the cached
+    history object.
+    """
+    history = session_cache.peek(session_id)
+    if history is not None:
+        session_cache.put(session_id, history)
+        schedule_summary(session_id)
+    return history
+
+def store_chat_history(session_id: str, user_input: str, ai_response: str, response_id: str = None,
+                       title: str = None) -> str:
+    """Store a chat turn in MongoDB and return the session title.
+
+    One find-and-modify reserves the turn's seq numbers and, if the session
+    is still "New Session", sets `title`; it returns the resulting title, so
+    no follow-up reads are needed. The two message documents are then written
+    with a single insert_many. With CHAT_WRITE_BEHIND the turn is queued
+    instead (or written synchronously while the queue is full) and the title
+    is resolved from the cached session.
+    """
+    turn = {
+        "session_id": session_id,
+        "user_input": user_input,
+        "ai_response": ai_response,
+        "response_id": response_id,
+        "title": title,
+        "created_at": time.time()
+    }
+    try:
+        if chat_write_queue is not None:
+            chat_write_queue.submit(turn)
+            history = refresh_cached_history(session_id) or get_session_history(session_id)
+            if title and history.title == "New Session":
+                history.title = title
+            return history.title or "New Session"
+
+        session = reserve_turns(session_id, 1, title)
+        seq = session["message_count"] - 2
+        chat_messages_collection.insert_many(turn_documents(session_id, seq, turn))
+        assign_turn_seqs(session_id, seq, user_input, ai_response)
+        refresh_cached_history(session_id)
+        return session.get("title", "New Session")
     except Exception as e:
         logger.error(f"Error storing chat history: {e}")
-
-def get_session_id():
-    """Extract session_id from the JWT token."""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or "Bearer " not in auth_header:
         return None
+
+def get_session_messages(session_id: str, cursor: int = None, limit: int = HISTORY_PAGE_SIZE):
+    """Return one page of messages older than `cursor` (seq), oldest first, plus the next cursor.
+
+    The page is an indexed range scan on (session_id, seq), so its cost does
+    not depend on how long the session is. next_cursor is None on the first page.
+    Messages of a session that has not been migrated yet are merged in from its
+    embedded array.
+    """
+    query = {"session_id": session_id}
+    if cursor is not None:
+        query["seq"] = {"$lt": cursor}
+    page = list(chat_messages_collection.find(query, {"_id": 0, "session_id": 0}).sort("seq", -1).limit(limit))
+    page.reverse()
+    session = chat_history_collection.find_one({"session_id": session_id, "messages.0": {"$exists": True}},
+                                               {"messages": 1})
+    if session:
+        stored = {msg["seq"] for msg in page}
+        legacy = [msg for msg in legacy_messages(session)
+                  if msg["seq"] not in stored and (cursor is None or msg["seq"] < cursor)]
+        page = sorted(legacy + page, key=lambda msg: msg["seq"])[-limit:]
+    next_cursor = page[0]["seq"] if page and page[0]["seq"] > 0 else None
+    return page, next_cursor
+
+def get_first_messages(session_id: str, limit: int = 2) -> list:
+    """Return the first `limit` messages of a session, migrated or not."""
+    messages = list(chat_messages_collection.find({"session_id": session_id}).sort("seq", 1).limit(limit))
+    session = chat_history_collection.find_one({"session_id": session_id, "messages.0": {"$exists": True}},
+                                               {"messages": 1})
+    if session:
+        stored = {msg["seq"] for msg in messages}
+        legacy = [msg for msg in legacy_messages(session)[:limit] if msg["seq"] not in stored]
+        messages = sorted(legacy + messages, key=lambda msg: msg["seq"])[:limit]
+    return messages
+
+token_cache = LRUCache(max_entries=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL) if TOKEN_CACHE_SIZE > 0 else None
+
+def decode_jwt(token: str):
+    """Verify and decode a JWT, reusing a cached result for tokens already verified.
+
+    The cache is keyed by the token's SHA-256 digest and a hit is only used
+    while the token's exp is still in the future.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    if token_cache is not None:
+        claims = token_cache.get(key)
+        if claims is not None and claims.get("exp", 0) > time.time():
+            return claims
     try:
-        token = auth_header.split(" ")[1]
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
-        session_id = payload.get("session_id")
-        if not session_id:
-            logger.error("No session_id in token")
-            return None
-        return session_id
+        claims = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
     except (jwt.ExpiredSignatureError, jwt.InvalidTokenError) as e:
         logger.error(f"Token error: {e}")
         return None
+    if token_cache is not None and "exp" in claims:
+        token_cache.put(key, claims)
+    return claims
+
+def get_auth_claims(req=None):
+    """Return the verified JWT claims for the current request, decoding at most once per request."""
+    req = req or request
+    if has_request_context() and req is request and "auth_claims" in g:
+        return g.auth_claims
+
+    claims = None
+    parts = (req.headers.get("Authorization") or "").split()
+    if len(parts) == 2 and parts[0].lower() == "bearer":
+        claims = decode_jwt(parts[1])
+
+    if has_request_context() and req is request:
+        g.auth_claims = claims
+    return claims
+
+def load_auth_context():
+    """before_request hook: put the request's JWT claims on flask.g.auth_claims."""
+    get_auth_claims()
+
+def get_session_id():
+    """Extract session_id from the JWT token."""
+    claims = get_auth_claims()
+    if not claims:
+        return None
+    session_id = claims.get("session_id")
+    if not session_id:
+        logger.error("No session_id in token")
+        return None
+    return session_id
 
 def store_session(session_id: str, user_id: str):
     """Store a new session in MongoDB with a default title."""
@@ -181,7 +719,7 @@ def store_session(session_id: str, user_id: str):
                 "session_id": session_id,
                 "user_id": user_id,
                 "title": "New Session",
-                "messages": [],
+                "message_count": 0,
                 "created_at": datetime.datetime.utcnow()
             })
             logger.info(f"New session created: {session_id}")
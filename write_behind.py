@@ -0,0 +1,168 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindQueue:
+    """In-process queue whose items are applied in batches by a background flusher.
+
+    A batch is applied once ``batch_size`` items are queued or ``interval``
+    seconds have passed since the last flush. A batch that fails is put back
+    at the front of the queue and retried up to ``max_retries`` times; after
+    that its items are applied one by one and those that still fail go to
+    ``dead_letter``, so one bad item cannot hold up everything behind it.
+
+    The queue holds at most ``max_size`` items. When it is full, ``submit``
+    waits up to ``full_timeout`` seconds for room and then applies the item
+    synchronously, so memory stays bounded during an outage and the caller
+    feels the back-pressure. Anything still queued at shutdown is
+    dead-lettered rather than dropped.
+    """
+
+    def __init__(self, apply_batch, batch_size: int = 100, interval: float = 0.5, name: str = "write-behind",
+                 max_size: int = 10000, max_retries: int = 5, full_timeout: float = 1.0, dead_letter=None):
+        self.apply_batch = apply_batch
+        self.batch_size = batch_size
+        self.interval = interval
+        self.name = name
+        self.max_size = max_size
+        self.max_retries = max_retries
+        self.full_timeout = full_timeout
+        self.dead_letter = dead_letter or self.log_dead_letter
+        self.items = deque()
+        self.inflight = []
+        self.attempts = 0  # Failed attempts of the batch at the head of the queue
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()  # One batch is applied at a time, in queue order
+        self.worker = None
+        self.flushes = 0
+        self.flushed_items = 0
+        self.failures = 0
+        self.sync_writes = 0
+        self.dead_lettered = 0
+        atexit.register(self.flush)
+
+    def ensure_worker(self):
+        """Start the flusher thread on first use (after any gunicorn fork)."""
+        if self.worker is None or not self.worker.is_alive():
+            with self.condition:
+                if self.worker is None or not self.worker.is_alive():
+                    self.worker = threading.Thread(target=self.run, name=self.name, daemon=True)
+                    self.worker.start()
+
+    def submit(self, item):
+        """Queue an item; wakes the flusher when a full batch is ready.
+
+        If the queue stays full for full_timeout seconds the item is applied
+        synchronously instead (raising whatever apply_batch raises).
+        """
+        self.ensure_worker()
+        with self.condition:
+            if not self.condition.wait_for(lambda: len(self.items) < self.max_size, timeout=self.full_timeout):
+                self.sync_writes += 1
+                queued = False
+            else:
+                self.items.append(item)
+                queued = True
+                if len(self.items) >= self.batch_size:
+                    self.condition.notify_all()
+        if not queued:
+            logger.warning(f"{self.name}: queue full ({self.max_size}), writing synchronously")
+            self.apply_batch([item])
+
+    def pending(self, predicate) -> list:
+        """Return queued and in-flight items matching predicate, oldest first."""
+        with self.condition:
+            return [item for item in list(self.inflight) + list(self.items) if predicate(item)]
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.items) >= self.batch_size, timeout=self.interval)
+            self.flush_batch()
+
+    def log_dead_letter(self, items: list):
+        logger.error(f"{self.name}: dropping {len(items)} items that could not be written: {items!r}")
+
+    def salvage(self, batch: list):
+        """Apply a batch that keeps failing item by item; dead-letter the items that still fail."""
+        failed = []
+        for item in batch:
+            try:
+                self.apply_batch([item])
+            except Exception as e:
+                logger.error(f"{self.name}: item failed after {self.max_retries} batch retries: {e}")
+                failed.append(item)
+        if failed:
+            self.dead_lettered += len(failed)
+            try:
+                self.dead_letter(failed)
+            except Exception as e:
+                logger.error(f"{self.name}: dead-letter handler failed: {e}")
+                self.log_dead_letter(failed)
+        return len(batch) - len(failed)
+
+    def flush_batch(self) -> int:
+        """Apply up to one batch; return how many items were written."""
+        with self.flush_lock:
+            with self.condition:
+                count = min(len(self.items), self.batch_size)
+                self.inflight = [self.items.popleft() for _ in range(count)]
+                self.condition.notify_all()  # Room for submitters waiting on a full queue
+            if not self.inflight:
+                return 0
+            try:
+                self.apply_batch(self.inflight)
+            except Exception as e:
+                self.failures += 1
+                self.attempts += 1
+                if self.attempts >= self.max_retries:
+                    written = self.salvage(self.inflight)
+                    self.attempts = 0
+                    with self.condition:
+                        self.flushed_items += written
+                        self.inflight = []
+                    return written
+                logger.error(f"{self.name}: failed to apply batch of {len(self.inflight)} "
+                             f"(attempt {self.attempts}/{self.max_retries}), will retry: {e}")
+                with self.condition:
+                    self.items.extendleft(reversed(self.inflight))
+                    self.inflight = []
+                time.sleep(self.interval)
+                return 0
+            with self.condition:
+                self.attempts = 0
+                self.flushes += 1
+                self.flushed_items += len(self.inflight)
+                self.inflight = []
+            return count
+
+    def flush(self, attempts: int = 3):
+        """Drain the queue synchronously (called at shutdown); dead-letter what cannot be written."""
+        while self.items and attempts > 0:
+            if not self.flush_batch():
+                attempts -= 1
+        with self.condition:
+            remaining, self.items = list(self.items), deque()
+        if remaining:
+            logger.error(f"{self.name}: {len(remaining)} items could not be written at shutdown")
+            self.dead_lettered += len(remaining)
+            self.dead_letter(remaining)
+
+    def stats(self) -> dict:
+        """Return queue depth and flush counters."""
+        with self.condition:
+            return {
+                "queued": len(self.items),
+                "inflight": len(self.inflight),
+                "max_size": self.max_size,
+                "flushes": self.flushes,
+                "flushed_items": self.flushed_items,
+                "mean_batch_size": round(self.flushed_items / self.flushes, 2) if self.flushes else 0.0,
+                "failures": self.failures,
+                "sync_writes": self.sync_writes,
+                "dead_lettered": self.dead_lettered,
+            }